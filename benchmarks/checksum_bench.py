@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Micro-benchmark of the LSA Fletcher checksum.
+
+Compares the per-byte loop pyospf used before with the pure-Python and the
+NumPy engines of pyospf.basic.ospfParser, on LSAs of 100 to 1500 bytes.
+
+    $ python benchmarks/checksum_bench.py
+"""
+
+import os
+import sys
+import timeit
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'pyospf', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from pyospf.basic import ospfParser
+
+
+SIZES = [100, 200, 500, 1000, 1500]
+NUMBER = 2000
+
+
+def loop_checksum(lsa):
+    """
+    The per-byte loop lsa_checksum used before, kept as the reference.
+    """
+    c0 = c1 = 0
+    for char in lsa[2:]:
+        c0 += ord(char)
+        c1 += c0
+    return ((c1 % 255) << 8) + (c0 % 255)
+
+
+def py_checksum(lsa):
+    c0, c1 = ospfParser._fletcher_sums_py(lsa[2:])
+    return (c1 << 8) + c0
+
+
+def numpy_checksum(lsa):
+    c0, c1 = ospfParser._fletcher_sums_numpy(lsa[2:])
+    return (c1 << 8) + c0
+
+
+def bench(func, lsa):
+    """
+    Return the best time of one call in microseconds.
+    """
+    return min(timeit.repeat(lambda: func(lsa), number=NUMBER, repeat=5)) / NUMBER * 1e6
+
+
+def main():
+    engines = [('loop', loop_checksum), ('python', py_checksum)]
+    if ospfParser.numpy is not None:
+        engines.append(('numpy', numpy_checksum))
+    engines.append(('lsa_checksum', ospfParser.lsa_checksum))
+
+    print '%6s  %s' % ('bytes', '  '.join(['%14s' % name for name, _ in engines]))
+    for size in SIZES:
+        lsa = os.urandom(size)
+        expected = loop_checksum(lsa)
+        times = []
+        for name, func in engines:
+            assert func(lsa) == expected, name
+            times.append(bench(func, lsa))
+        print '%6d  %s' % (size, '  '.join(['%7.2f us %4.1fx' % (t, times[0] / t) for t in times]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Synthetic OSPF packets for the benchmarks, built with the dpkt classes of
+pyospf.basic.ospfPacket. Every packet is a complete IP datagram as read
+from the raw socket, with valid OSPF and LSA checksums.
+"""
+
+import os
+import sys
+import socket
+import struct
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'pyospf', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from dpkt.ip import IP, IP_PROTO_OSPF
+from dpkt.ospf import OSPF
+
+from pyospf.basic.ospfPacket import *
+from pyospf.basic.constant import ALL_SPF_ROUTER
+
+
+SRC_IP = '10.0.0.2'
+ROUTER_ID = 0x02020202
+LSA_OPTIONS = 0x22      # E, DC
+
+
+def fill_lsa_checksum(lsa):
+    """
+    Fill in the Fletcher checksum of an LSA (RFC 905 annex B), the
+    checksum field at offset 16 must be zero.
+    """
+    data = bytearray(lsa[2:])
+    c0 = c1 = 0
+    for b in data:
+        c0 = (c0 + b) % 255
+        c1 = (c1 + c0) % 255
+    n, pos = len(data), 15      # 1-based position of the checksum in data
+    x = ((n - pos) * c0 - c1) % 255 or 255
+    y = (c1 - (n - pos + 1) * c0) % 255 or 255
+    return lsa[:16] + chr(x) + chr(y) + lsa[18:]
+
+
+def make_lsa(ls_type, lsid, adv, body, seq=0x80000001, age=1):
+    hdr = LSAHeader(age=age, options=LSA_OPTIONS, type=ls_type, id=lsid, adv=adv,
+                    seq=seq, sum=0, len=len(LSAHeader()) + len(body))
+    return fill_lsa_checksum(str(hdr) + body)
+
+
+def router_lsa(rid, nlinks, seq=0x80000001):
+    body = str(RouterLSA(veb=0x01, linknum=nlinks))
+    for i in range(nlinks):
+        body += str(LinkLSA(linkid=0x0a000000 + (i << 8), linkdata=0x0a000001 + (i << 8),
+                            type=1 + i % 3, tosnumber=0, metric=10))
+    return make_lsa(1, rid, rid, body, seq)
+
+
+def network_lsa(dr, rtrs, seq=0x80000001):
+    body = str(NetworkLSA(mask=0xffffff00))
+    for i in range(rtrs):
+        body += str(AttachedRouter(attached=0x01010101 + i))
+    return make_lsa(2, dr, dr, body, seq)
+
+
+def summary_lsa(prefix, adv, seq=0x80000001, ls_type=3):
+    return make_lsa(ls_type, prefix, adv, str(SummaryLSA(mask=0xffffff00, metric=20)), seq)
+
+
+def external_lsa(prefix, adv, seq=0x80000001):
+    body = str(ExternalLSA(mask=0xffffff00, metric=0x80000014, forwarding=0, tag=100))
+    return make_lsa(5, prefix, adv, body, seq)
+
+
+def lsa_header(lsa):
+    """
+    The 20-byte header of an encoded LSA, as carried in DD and LSAck.
+    """
+    return lsa[:len(LSAHeader())]
+
+
+def ospf_packet(ospf_type, data, dst=ALL_SPF_ROUTER):
+    ospf = str(OSPF(v=2, type=ospf_type, area=0, router=ROUTER_ID,
+                    len=len(OSPF()) + len(data), data=data))
+    ip = IP(src=socket.inet_aton(SRC_IP), dst=socket.inet_aton(dst),
+            p=IP_PROTO_OSPF, ttl=1, data=ospf)
+    ip.len = len(IP()) + len(ospf)
+    return str(ip)
+
+
+def hello_packet(neighbors=0):
+    hello = Hello(mask=0xffffff00, hellointerval=10, options=0x02, pri=1,
+                  deadinterval=40, router=0x0a000001, backup=0)
+    for i in range(neighbors):
+        hello.data += str(HelloNeighbor(neighbor=0x01010101 + i))
+    return ospf_packet(1, str(hello))
+
+
+def dd_packet(lsas, seq=1):
+    dd = DBDesc(mtu=1500, options=0x42, ddoptions=0x03, ddseq=seq)
+    return ospf_packet(2, str(dd) + ''.join([lsa_header(lsa) for lsa in lsas]))
+
+
+def lsu_packet(lsas):
+    return ospf_packet(4, str(LSU(lsanum=len(lsas))) + ''.join(lsas))
+
+
+def lsack_packet(lsas):
+    return ospf_packet(5, ''.join([lsa_header(lsa) for lsa in lsas]))
+
+
+def mixed_lsas(count, seq=0x80000001):
+    """
+    count LSAs mixing router, network, summary and external LSAs.
+    """
+    lsas = []
+    for i in range(count):
+        kind = i % 8
+        if kind == 0:
+            lsas.append(router_lsa(0x01000000 + i, 4 + i % 12, seq))
+        elif kind == 1:
+            lsas.append(network_lsa(0x0a000000 + i, 2 + i % 6, seq))
+        elif kind in (2, 3, 4):
+            lsas.append(summary_lsa(0x14000000 + (i << 8), 0x01000001, seq))
+        else:
+            lsas.append(external_lsa(0x1e000000 + (i << 8), 0x01000001, seq))
+    return lsas
+
+
+def split_lsu(lsas, mtu=1500):
+    """
+    Pack LSAs into as few LSUs as fit into the MTU.
+    """
+    room = mtu - len(IP()) - len(OSPF()) - len(LSU())
+    pkts, batch, size = [], [], 0
+    for lsa in lsas:
+        if batch and size + len(lsa) > room:
+            pkts.append(lsu_packet(batch))
+            batch, size = [], 0
+        batch.append(lsa)
+        size += len(lsa)
+    if batch:
+        pkts.append(lsu_packet(batch))
+    return pkts
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Parser benchmark suite for OspfParser.parse.
+
+Every case is a set of synthetic packets from benchmarks/corpus.py. For each
+case it reports throughput (packets and LSAs per second), per-call latency
+(p50/p99/max) and the memory allocated for the parsed result. The LSA cache
+is disabled, so every LSA is checksummed and decoded.
+
+    $ python benchmarks/parser_bench.py
+    $ python benchmarks/parser_bench.py --json result.json
+    $ python benchmarks/parser_bench.py --compare result.json --threshold 0.2
+
+With --compare, cases whose throughput dropped by more than the threshold
+against an earlier --json result are listed and the exit status is 1.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import platform
+import argparse
+
+from timeit import default_timer
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'pyospf', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+import corpus
+from pyospf.basic import ospfParser
+from pyospf.basic.ospfParser import OspfParser
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+ROUNDS = 5          # throughput is the best of ROUNDS, to ride out scheduler noise
+DURATION = 0.3      # seconds per throughput round
+SAMPLES = 2000      # timed single calls for the latency percentiles,
+MIN_SAMPLES = 200   # or at least MIN_SAMPLES when SAMPLE_TIME runs out
+SAMPLE_TIME = 2.0
+
+
+def cases():
+    """
+    Return [(name, packets, lsas per pass)].
+    """
+    lsas = corpus.mixed_lsas(2000)
+    return [
+        ('hello-8', [corpus.hello_packet(8)], 0),
+        ('dd-10', [corpus.dd_packet(lsas[:10])], 10),
+        ('dd-70', [corpus.dd_packet(lsas[:70])], 70),
+        ('lsack-10', [corpus.lsack_packet(lsas[:10])], 10),
+        ('lsack-70', [corpus.lsack_packet(lsas[:70])], 70),
+        ('lsu-1', [corpus.lsu_packet(lsas[:1])], 1),
+        ('lsu-10', [corpus.lsu_packet(lsas[:10])], 10),
+        ('lsu-mtu', corpus.split_lsu(lsas[:1000]), 1000),
+        ('lsu-64k', [corpus.lsu_packet(lsas[:1200])], 1200),
+    ]
+
+
+def throughput(parse, pkts):
+    """
+    Best packets per second over ROUNDS rounds of DURATION seconds.
+    """
+    best = 0
+    for _ in range(ROUNDS):
+        count = 0
+        start = default_timer()
+        while default_timer() - start < DURATION:
+            for pkt in pkts:
+                parse(pkt)
+            count += len(pkts)
+        best = max(best, count / (default_timer() - start))
+    return best
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def latency(parse, pkts):
+    """
+    Latency percentiles of single parse calls, in microseconds.
+    """
+    samples = []
+    gc.collect()
+    deadline = default_timer() + SAMPLE_TIME
+    while len(samples) < SAMPLES and (len(samples) < MIN_SAMPLES or default_timer() < deadline):
+        for pkt in pkts:
+            start = default_timer()
+            parse(pkt)
+            samples.append(default_timer() - start)
+    samples.sort()
+    return { 'p50_us': percentile(samples, 0.50) * 1e6,
+             'p99_us': percentile(samples, 0.99) * 1e6,
+             'max_us': samples[-1] * 1e6,
+             }
+
+
+def _walk(obj, seen):
+    """
+    Count the objects and bytes reachable from a parse result.
+    """
+    if id(obj) in seen:
+        return 0, 0
+    seen.add(id(obj))
+    objects, size = 1, sys.getsizeof(obj)
+    children = ()
+    if isinstance(obj, dict):
+        children = list(obj.keys()) + list(obj.values())
+    elif isinstance(obj, (list, tuple)):
+        children = obj
+    for child in children:
+        o, s = _walk(child, seen)
+        objects += o
+        size += s
+    raw = getattr(obj, 'raw', None)
+    if raw is not None:
+        o, s = _walk(raw, seen)
+        objects += o
+        size += s
+    return objects, size
+
+
+def allocations(parse, pkts):
+    """
+    Objects and bytes held by the parse results of one pass, plus the
+    traced peak when tracemalloc is available.
+    """
+    objects = size = 0
+    for pkt in pkts:
+        o, s = _walk(parse(pkt), set())
+        objects += o
+        size += s
+    rv = { 'result_objects': objects,
+           'result_bytes': size,
+           }
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        results = [parse(pkt) for pkt in pkts]
+        rv['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del results
+    return rv
+
+
+def run(eager=False):
+    parse = OspfParser.parse
+    if eager:
+        parse = lambda pkt: OspfParser.parse(pkt, lazy=False)
+
+    results = []
+    for name, pkts, nlsas in cases():
+        for pkt in pkts:
+            assert parse(pkt) is not None, name
+        pps = throughput(parse, pkts)
+        result = { 'case': name,
+                   'packets': len(pkts),
+                   'bytes': sum([len(pkt) for pkt in pkts]),
+                   'pkt_per_sec': pps,
+                   'lsa_per_sec': pps * nlsas / len(pkts),
+                   }
+        result.update(latency(parse, pkts))
+        result.update(allocations(parse, pkts))
+        results.append(result)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the cases whose throughput dropped by more than threshold.
+    """
+    old = dict([(r['case'], r) for r in baseline['results']])
+    regressions = []
+    for r in results:
+        if r['case'] in old and r['pkt_per_sec'] < old[r['case']]['pkt_per_sec'] * (1 - threshold):
+            regressions.append((r['case'], old[r['case']]['pkt_per_sec'], r['pkt_per_sec']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OspfParser.parse benchmark suite.')
+    parser.add_argument('--json', metavar='FILE', help="write results as JSON, '-' for stdout")
+    parser.add_argument('--eager', action='store_true', help='decode LSA bodies (lazy=False)')
+    parser.add_argument('--compare', metavar='FILE', help='JSON results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='tolerated throughput drop for --compare (default 0.2)')
+    args = parser.parse_args()
+
+    cache = getattr(ospfParser, 'LSA_CACHE', None)
+    if cache is not None:
+        # Measure the cold path, every LSA is checksummed and decoded.
+        cache.resize(0)
+
+    results = run(args.eager)
+    report = { 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(),
+               'numpy': getattr(ospfParser, 'numpy', None) is not None,
+               'lazy': not args.eager,
+               'results': results,
+               }
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        print '%-10s %10s %10s %9s %9s %9s %9s' % (
+            'case', 'pkt/s', 'lsa/s', 'p50 us', 'p99 us', 'objects', 'KiB')
+        for r in results:
+            print '%-10s %10.0f %10.0f %9.1f %9.1f %9d %9.1f' % (
+                r['case'], r['pkt_per_sec'], r['lsa_per_sec'], r['p50_us'], r['p99_us'],
+                r['result_objects'], r['result_bytes'] / 1024.0)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for case, old, new in regressions:
+            sys.stderr.write('REGRESSION %s: %.0f -> %.0f pkt/s\n' % (case, old, new))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
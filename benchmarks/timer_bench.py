@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Benchmark of the reactor timer stores with many armed timers.
+
+Arms N timers (10000 by default) spread over the OSPF timer range, then
+measures per timer the cost of arming, resetting (as every Hello does to
+the inactivity timer), cancelling and expiring them, for the hierarchical
+TimingWheel and the TimerHeap. The clock is synthetic, so expiry measures
+the bookkeeping only.
+
+    $ python benchmarks/timer_bench.py
+    $ python benchmarks/timer_bench.py --timers 50000
+"""
+
+import os
+import sys
+import random
+import argparse
+
+from timeit import default_timer
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'pyospf', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from pyospf.utils.reactor import TimerHeap
+from pyospf.utils.timer import Timer
+from pyospf.utils.wheel import TimingWheel
+
+
+ROUNDS = 5
+START = 1000000.0
+INTERVALS = [1, 5, 10, 40]      # LSA age step, RxmtInterval, Hello, Dead
+
+
+def make_timers(count):
+    return [Timer(random.choice(INTERVALS)) for _ in xrange(count)]
+
+
+def bench_store(store_cls, count):
+    """
+    Best per-timer microseconds of each operation over ROUNDS rounds.
+    """
+    best = {}
+    for _ in range(ROUNDS):
+        timers = make_timers(count)
+        store = store_cls(now=START) if store_cls is TimingWheel else store_cls()
+        result = {}
+
+        start = default_timer()
+        for t in timers:
+            store.add(t, START + t.runTime)
+        result['arm'] = default_timer() - start
+
+        #every timer reset ten times, a little later each time
+        start = default_timer()
+        for i in xrange(1, 11):
+            for t in timers:
+                store.add(t, START + i * 0.1 + t.runTime)
+        result['reset'] = (default_timer() - start) / 10
+
+        start = default_timer()
+        for t in timers[::2]:
+            store.cancel(t)
+        result['cancel'] = (default_timer() - start) * 2
+
+        #run the clock past every deadline in steps of 10 ms
+        start = default_timer()
+        fired = 0
+        now = START
+        while len(store):
+            now += 0.01
+            fired += len(store.expire(now))
+        result['expire'] = (default_timer() - start) / fired
+
+        for op, t in result.items():
+            best[op] = min(best.get(op, t), t)
+    return dict([(op, t / count * 1e6 if op != 'expire' else t * 1e6) for op, t in best.items()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reactor timer store benchmark.')
+    parser.add_argument('--timers', type=int, default=10000, help='armed timers (default 10000)')
+    args = parser.parse_args()
+
+    random.seed(0)
+    print '%d armed timers, microseconds per timer' % args.timers
+    print '%-12s %8s %8s %8s %8s' % ('store', 'arm', 'reset', 'cancel', 'expire')
+    for name, cls in [('TimingWheel', TimingWheel), ('TimerHeap', TimerHeap)]:
+        r = bench_store(cls, args.timers)
+        print '%-12s %8.2f %8.2f %8.2f %8.2f' % (name, r['arm'], r['reset'], r['cancel'], r['expire'])
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,7 @@ from flask import Flask, request, Response
 
 
 from pyospf.utils import util
+from pyospf.basic.ospfParser import decodeOspfLsaBody
 
 
 app = Flask(__name__)
@@ -20,7 +21,10 @@ def return_json(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         r = f(*args, **kwargs)
-        return Response(r, content_type='application/json; charset=utf-8')
+        headers = None
+        if isinstance(r, tuple):
+            r, headers = r
+        return Response(r, content_type='application/json; charset=utf-8', headers=headers)
     return decorated_function
 
 
@@ -42,6 +46,41 @@ def check_auth(usr, pwd):
     return usr == username and pwd == password
 
 
+def decode_lsa(lsa):
+    """LSAs are kept with a raw body in the LSDB, decode it into a copy for
+    output, the snapshot LSAs are shared with the protocol threads and never
+    changed. The arrival time is kept as a monotonic clock value, shown as a date."""
+    out = dict(lsa)
+    raw = getattr(lsa, 'raw', None)
+    if 'V' not in out and raw is not None and not getattr(lsa, 'bad', False):
+        try:
+            body = decodeOspfLsaBody(lsa['T'], memoryview(raw), 0, len(raw))
+        except Exception, e:
+            LOG.error('[API] LSA body decode error: %s.' % e)
+            body = None
+        if body is not None:
+            out['V'] = body
+    if 'TIMESTAMP' in out:
+        out['TIMESTAMP'] = util.monotonic_to_str(out['TIMESTAMP'])
+    return out
+
+
+#{lsa type: (snapshot version of the type, JSON of its LSAs)}
+rendered_lsa_lists = dict()
+
+
+def render_lsa_list(snapshot, lsa_type):
+    """JSON of the LSAs of one type in an LSDB snapshot, rendered again only
+    when the type changed since."""
+    version = snapshot.versions[lsa_type]
+    rendered = rendered_lsa_lists.get(lsa_type)
+    if rendered is None or rendered[0] != version:
+        lsas = dict([(str(k), decode_lsa(v)) for k, v in snapshot.items(lsa_type)])
+        #Opaque data and unknown TLVs are raw bytes, latin-1 maps them to JSON unchanged.
+        rendered = rendered_lsa_lists[lsa_type] = (version, json.dumps(lsas, encoding='latin-1'))
+    return rendered[1]
+
+
 def authenticate():
     """Sends a 401 response that enables basic auth"""
     return Response(
@@ -55,29 +94,52 @@ def authenticate():
 @requires_auth
 @return_json
 def lsdb(ltype=None):
-    lsdb = ospf_instance.lsdb.lsdb
-    lsdb_no_tuple = dict()
+    snapshot = ospf_instance.lsdb.snapshot
     if ltype:
-        if not ltype in lsdb:
+        if not ltype in snapshot.versions:
             return json.dumps({})
-        else:
-            lsdb_no_tuple[ltype] = dict([(str(k), v) for k, v in lsdb[ltype].items()])
+        lsa_types = [ltype]
     else:
-        for lsa_type in lsdb:
-            lsdb_no_tuple[lsa_type] = dict([(str(k), v) for k, v in lsdb[lsa_type].items()])
-    return json.dumps(lsdb_no_tuple)
+        lsa_types = snapshot.types()
+    #the sequence number to ask /lsdb/changes for the changes after this LSDB from
+    return ('{%s}' % ', '.join(['%s: %s' % (json.dumps(t), render_lsa_list(snapshot, t)) for t in lsa_types]),
+            {'X-LSDB-Seq': str(snapshot.seq)})
+
+
+@app.route('/lsdb/changes')
+@requires_auth
+@return_json
+def lsdb_changes():
+    """
+    The LSDB changes after sequence number since, oldest first. resync is
+    true when they are not all known any more, then /lsdb has to be read
+    again, and polling goes on from its X-LSDB-Seq header.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return json.dumps({'error': 'since must be a sequence number'})
+    seq, changes = ospf_instance.lsdb.changes_since(since)
+    result = {
+        'seq': seq,
+        'since': since,
+        'resync': changes is None,
+        'changes': [{'seq': n, 'op': op, 'type': lsa_type, 'key': str(ls) if ls is not None else None, 'header': hdr}
+                    for (n, op, lsa_type, ls, hdr) in changes or []],
+    }
+    return json.dumps(result, encoding='latin-1')
 
 
 @app.route('/lsdb_summary')
 @requires_auth
 @return_json
 def lsdb_summary():
-    lsdb = ospf_instance.lsdb.lsdb
+    snapshot = ospf_instance.lsdb.snapshot
     lsdb_summary = dict()
     total_lsa = 0
-    for lsa_type in lsdb:
-        total_lsa += len(lsdb[lsa_type])
-        lsdb_summary[lsa_type] = len(lsdb[lsa_type])
+    for lsa_type in snapshot.types():
+        total_lsa += snapshot.count(lsa_type)
+        lsdb_summary[lsa_type] = snapshot.count(lsa_type)
     lsdb_summary['total_lsa'] = total_lsa
 
     return json.dumps(lsdb_summary)
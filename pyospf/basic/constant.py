@@ -5,7 +5,6 @@
 import threading
 
 neighborLock = threading.RLock()
-datetimeLock = threading.RLock()
 
 ALL_SPF_ROUTER = '224.0.0.5'
 ALL_D_ROUTER = '224.0.0.6'
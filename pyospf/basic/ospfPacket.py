@@ -221,6 +221,7 @@ class RouterLSA(dpkt.Packet):
     """
     __hdr__ = (
         ('veb', 'B', 0),
+        ('reserved', 'B', 0),
         ('linknum', 'H', 0)
     )
 
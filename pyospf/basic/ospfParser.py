@@ -69,20 +69,34 @@
 import traceback
 import struct
 import logging
+import threading
 import dpkt
 
+from binascii import hexlify
+from collections import namedtuple, OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from pyospf.utils.util import *
 
 
 LOG = logging.getLogger(__name__)
 
-INDENT          = "    "
-
 RECV_BUF_SZ      = 8192
 OSPF_LISTEN_PORT = 89
 LS_INFINITY      = 0xffff
 LS_STUB_RTR      = 0xffffff
 
+# LSAs at least this long are checksummed with NumPy when it is available,
+# below it the call overhead outweighs the vectorised sums.
+CKSUM_NUMPY_MIN_LEN = 200
+
+# Default number of verified LSA instances kept by LSA_CACHE.
+LSA_CACHE_SIZE = 10000
+
 IP_HDR     = "> BBH HH BBH LL"
 IP_HDR_LEN = struct.calcsize(IP_HDR)
 
@@ -128,6 +142,33 @@ OSPF_LSAEXT_METRIC_LEN = struct.calcsize(OSPF_LSAEXT_METRIC)
 OSPF_OPAQUE_TL     = "> HH"
 OSPF_OPAQUE_TL_LEN = struct.calcsize(OSPF_OPAQUE_TL)
 
+OSPF_NBOR     = "> L"
+OSPF_NBOR_LEN = struct.calcsize(OSPF_NBOR)
+
+## Precompiled structs, never pass a format string to struct in the parsers.
+
+IP_HDR_ST             = struct.Struct(IP_HDR)
+OSPF_HDR_ST           = struct.Struct(OSPF_HDR)
+OSPF_HELLO_ST         = struct.Struct(OSPF_HELLO)
+OSPF_DESC_ST          = struct.Struct(OSPF_DESC)
+OSPF_LSREQ_ST         = struct.Struct(OSPF_LSREQ)
+OSPF_LSUPD_ST         = struct.Struct(OSPF_LSUPD)
+OSPF_LSAHDR_ST        = struct.Struct(OSPF_LSAHDR)
+OSPF_LSARTR_ST        = struct.Struct(OSPF_LSARTR)
+OSPF_LSANET_ST        = struct.Struct(OSPF_LSANET)
+OSPF_LSASUMMARY_ST    = struct.Struct(OSPF_LSASUMMARY)
+OSPF_LINK_ST          = struct.Struct(OSPF_LINK)
+OSPF_METRIC_ST        = struct.Struct(OSPF_METRIC)
+OSPF_LSAEXT_ST        = struct.Struct(OSPF_LSAEXT)
+OSPF_LSAEXT_METRIC_ST = struct.Struct(OSPF_LSAEXT_METRIC)
+OSPF_OPAQUE_TL_ST     = struct.Struct(OSPF_OPAQUE_TL)
+OSPF_NBOR_ST          = struct.Struct(OSPF_NBOR)
+
+OSPF_TE_BYTE_ST  = struct.Struct("> B")
+OSPF_TE_LONG_ST  = struct.Struct("> L")
+OSPF_TE_FLOAT_ST = struct.Struct("> f")
+OSPF_TE_PRIO_ST  = struct.Struct("> f f f f f f f f")
+
 ################################################################################
 
 MSG_TYPES = { 1L: "HELLO",
@@ -199,28 +240,20 @@ RTR_LINK_TYPE = { 1L: "P2P",
 
 ################################################################################
 
+## Zero-copy decoders. They walk one memoryview with offsets instead of
+## re-slicing the remaining bytes after every element, so an LSU is
+## decoded in linear time. Nothing is printed on this path, see
+## pyospf.basic.ospfPrinter for displaying decoded packets. LSAs in an
+## LSU are returned as LazyLsa, whose body is decoded on first access.
 
-def parseIpHdr(msg, verbose=1, level=0):
 
-    if verbose > 1: print prtbin(level*INDENT, msg[:IP_HDR_LEN])
+def decodeIpHdr(buf, off):
 
     (verhlen, tos, iplen, ipid, frag, ttl, proto, cksum, src, dst) =\
-    struct.unpack(IP_HDR, msg)
-
-    ver  = (verhlen & 0xf0) >> 4
-    hlen = (verhlen & 0x0f) * 4
-
-    if verbose > 0:
-        print level*INDENT +\
-              "IP (len=%d)" % len(msg)
-        print (level+1)*INDENT +\
-              "ver:%s, hlen:%s, tos:%s, len:%s, id:%s, frag:%s, ttl:%s, prot:%s, cksm:%x" %\
-              (ver, hlen, int2bin(tos), iplen, ipid, frag, ttl, proto, cksum)
-        print (level+1)*INDENT +\
-              "src:%s, dst:%s" % (id2str(src), id2str(dst))
-
-    return { "VER"   : ver,
-             "HLEN"  : hlen,
+    IP_HDR_ST.unpack_from(buf, off)
+
+    return { "VER"   : (verhlen & 0xf0) >> 4,
+             "HLEN"  : (verhlen & 0x0f) * 4,
              "TOS"   : tos,
              "IPLEN" : iplen,
              "IPID"  : ipid,
@@ -233,15 +266,9 @@ def parseIpHdr(msg, verbose=1, level=0):
     }
 
 
-def parseOspfHdr(msg, verbose=1, level=0):
-
-    if verbose > 1: print prtbin(level*INDENT, msg[:OSPF_HDR_LEN])
-    (ver, typ, len, rid, aid, cksum, autype, auth1, auth2) = struct.unpack(OSPF_HDR, msg)
+def decodeOspfHdr(buf, off):
 
-    if verbose > 0:
-        print level*INDENT +\
-              "OSPF: ver:%s, type:%s, len:%s, rtr id:%s, area id:%s, cksum:%x, autype:%s" %\
-              (ver, MSG_TYPES[typ], len, id2str(rid), id2str(aid), cksum, AU_TYPES[autype],)
+    (ver, typ, len, rid, aid, cksum, autype, auth1, auth2) = OSPF_HDR_ST.unpack_from(buf, off)
 
     return { "VER"    : ver,
              "TYPE"   : typ,
@@ -254,53 +281,39 @@ def parseOspfHdr(msg, verbose=1, level=0):
              "AUTH2"  : auth2,
              }
 
-def parseOspfOpts(opts, verbose=1, level=0):
-
-    if verbose > 1: print level*INDENT + int2bin(opts)
-
-    qbit = (opts & 0x01)  # RFC 2676; reclaim original "T"-bit for TOS routing cap.
-    ebit = (opts & 0x02) >> 1
-    mcbit = (opts & 0x04) >> 2
-    npbit = (opts & 0x08) >> 3
-    lbit = (opts & 0x10) >> 4
-    dcbit = (opts & 0x20) >> 5
-    obit = (opts & 0x40) >> 6
-    dnbit = (opts & 0x80) >> 7
-
-    if verbose > 0:
-        print level*INDENT + "options: %s %s %s %s %s %s %s %s" %(
-            qbit*"Q", ebit*"E", mcbit*"MC", npbit*"NP", lbit*"L", dcbit*"DC", obit*"O", dnbit*'DN')
-
-    return { "Q"  : qbit,
-             "E"  : ebit,
-             "MC" : mcbit,
-             "NP" : npbit,
-             "L" : lbit,
-             "DC" : dcbit,
-             "O"  : obit,
-             "DN" : dnbit
+
+def _make_opts(opts):
+
+    return { "Q"  : (opts & 0x01),
+             "E"  : (opts & 0x02) >> 1,
+             "MC" : (opts & 0x04) >> 2,
+             "NP" : (opts & 0x08) >> 3,
+             "L"  : (opts & 0x10) >> 4,
+             "DC" : (opts & 0x20) >> 5,
+             "O"  : (opts & 0x40) >> 6,
+             "DN" : (opts & 0x80) >> 7
              }
 
+# Options dicts for all 256 values, decodeOspfOpts hands out copies.
+OSPF_OPTS_TABLE = [_make_opts(opts) for opts in xrange(256)]
+
+
+def decodeOspfOpts(opts):
+    return OSPF_OPTS_TABLE[opts].copy()
 
-def parseOspfLsaHdr(hdr, verbose=1, level=0):
 
-    (age, opts, typ, lsid, advrtr, lsseqno, cksum, length) = struct.unpack(OSPF_LSAHDR, hdr)
+def decodeOspfLsaHdr(buf, off):
 
-    if verbose > 0:
-        print level*INDENT +\
-              "age:%s, type:%s, lsid:%s, advrtr:%s, lsseqno:%s, cksum:%x, len:%s" %(
-                  age, LSA_TYPES[typ], id2str(lsid), id2str(advrtr), lsseqno, cksum, length)
+    (age, opts, typ, lsid, advrtr, lsseqno, cksum, length) = OSPF_LSAHDR_ST.unpack_from(buf, off)
 
     #Parse the first bit to check whether set DNA bit
     do_not_age = age >> 15
     if do_not_age == 1:
         age &= 0x7FFF
 
-    opts = parseOspfOpts(opts, verbose, level)
-
     return { "DNA"     : do_not_age,
              "AGE"     : age,
-             "OPTS"    : opts,
+             "OPTS"    : decodeOspfOpts(opts),
              "T"       : typ,
              "LSID"    : lsid,
              "ADVRTR"  : advrtr,
@@ -310,39 +323,38 @@ def parseOspfLsaHdr(hdr, verbose=1, level=0):
              }
 
 
-def parseOspfLsaRtr(lsa, verbose=1, level=0):
-
-    if verbose > 1: print prtbin(level*INDENT, lsa[:OSPF_LSARTR_LEN])
-    (veb, _, nlinks, ) = struct.unpack(OSPF_LSARTR, lsa[:OSPF_LSARTR_LEN])
-    b = (veb & 0x01)
-    e = (veb & 0x02) >> 1
-    v = (veb & 0x04) >> 2
-    if verbose > 0:
-        print level*INDENT + "nlinks:%s, rtr desc: %s %s %s" %(
-            nlinks, v*"VIRTUAL", e*"EXTERNAL", b*"BORDER")
-
-    lsa = lsa[OSPF_LSARTR_LEN:] ; i = 0 ; links = {}
-    while i < nlinks:
-        i += 1
-
-        if verbose > 1: print prtbin((level+1)*INDENT, lsa[:OSPF_LINK_LEN])
-        (lid, ldata, ltype, ntos, metric) = struct.unpack(OSPF_LINK, lsa[:OSPF_LINK_LEN])
-        if verbose > 0:
-            print (level+1)*INDENT +\
-                  "%s: link id:%s, link data:%s, link type:%s, ntos:%s, metric:%s" %(
-                      i, id2str(lid), id2str(ldata), RTR_LINK_TYPE[ltype], ntos, metric)
-
-        lsa = lsa[OSPF_LINK_LEN:] ; j = 0 ; metrics = { 0: metric, }
-        while j < ntos:
-            j += 1
-
-            if verbose > 1: print prtbin((level+2)*INDENT, lsa[:OSPF_METRIC_LEN])
-            (tos, _, metric) = struct.unpack(OSPF_METRIC, lsa[:OSPF_METRIC_LEN])
-            if verbose > 0:
-                print (level+2)*INDENT +\
-                      "%s: tos:%s, metric:%s" % (j, int2bin(tos), metric)
+class LsaHdr(namedtuple('LsaHdr', 'age opts type lsid advrtr seqno cksum length')):
+    """
+    Compact LSA header, used for the header lists of DD and LSAck packets.
+    The fields are as on the wire: age still carries the DNA bit, and opts
+    is the options bitmask (see OspfProtocol.convert_options_to_int).
+    """
+    __slots__ = ()
+
+
+def decodeOspfLsaHdrs(buf, off, end):
+    """
+    Decode consecutive LSA headers into a list of LsaHdr.
+    """
+    make, unpack = LsaHdr._make, OSPF_LSAHDR_ST.unpack_from
+    return [make(unpack(buf, o)) for o in xrange(off, end - OSPF_LSAHDR_LEN + 1, OSPF_LSAHDR_LEN)]
+
+
+def decodeOspfLsaRtr(buf, off, end):
+
+    (veb, _, nlinks, ) = OSPF_LSARTR_ST.unpack_from(buf, off)
+    off += OSPF_LSARTR_LEN
+
+    links = {}
+    for i in xrange(1, nlinks + 1):
+        (lid, ldata, ltype, ntos, metric) = OSPF_LINK_ST.unpack_from(buf, off)
+        off += OSPF_LINK_LEN
+
+        metrics = { 0: metric, }
+        for _ in xrange(ntos):
+            (tos, _, metric) = OSPF_METRIC_ST.unpack_from(buf, off)
             metrics[tos] = metric
-            lsa = lsa[OSPF_METRIC_LEN:]
+            off += OSPF_METRIC_LEN
 
         links[i] = { "ID"      : lid,
                      "DATA"    : ldata,
@@ -351,307 +363,312 @@ def parseOspfLsaRtr(lsa, verbose=1, level=0):
                      "METRICS" : metrics,
                      }
 
-    return { "VIRTUAL"  : v,
-             "EXTERNAL" : e,
-             "BORDER"   : b,
+    return { "VIRTUAL"  : (veb & 0x04) >> 2,
+             "EXTERNAL" : (veb & 0x02) >> 1,
+             "BORDER"   : (veb & 0x01),
              "NLINKS"   : nlinks,
              "LINKS"    : links,
              }
 
 
-def parseOspfLsaNet(lsa, verbose=1, level=0):
-
-    if verbose > 1: print prtbin(level*INDENT, lsa[:OSPF_LSANET_LEN])
-    (mask, ) = struct.unpack(OSPF_LSANET, lsa[:OSPF_LSANET_LEN])
-    if verbose > 0: print level*INDENT + "mask:%s" % (id2str(mask), )
-
-    lsa = lsa[OSPF_LSANET_LEN:] ; cnt = 0 ; rtrs = []
-    while len(lsa) > 0:
-        cnt += 1
+def decodeOspfLsaNet(buf, off, end):
 
-        if verbose > 1: print prtbin((level+1)*INDENT, lsa[:OSPF_LSANET_LEN])
-        (rtr,) = struct.unpack(OSPF_LSANET, lsa[:OSPF_LSANET_LEN])
-        if verbose > 0:
-            print (level+1)*INDENT + "%s: attached rtr:%s" % (cnt, id2str(rtr))
+    (mask, ) = OSPF_LSANET_ST.unpack_from(buf, off)
+    off += OSPF_LSANET_LEN
 
+    rtrs = []
+    while off < end:
+        (rtr, ) = OSPF_LSANET_ST.unpack_from(buf, off)
         rtrs.append(rtr)
-        lsa = lsa[OSPF_LSANET_LEN:]
+        off += OSPF_LSANET_LEN
 
     return { "MASK" : mask,
              "RTRS" : rtrs
     }
 
 
-def parseOspfLsaSummary(lsa, verbose=1, level=0):
+def decodeOspfLsaSummary(buf, off, end):
 
-    if verbose > 1: print prtbin(level*INDENT, lsa[:OSPF_LSASUMMARY_LEN])
-    (mask, ) = struct.unpack(OSPF_LSASUMMARY, lsa[:OSPF_LSASUMMARY_LEN])
-    if verbose > 0:
-        print level*INDENT + "mask:%s" % (id2str(mask), )
+    (mask, ) = OSPF_LSASUMMARY_ST.unpack_from(buf, off)
+    off += OSPF_LSASUMMARY_LEN
 
-    lsa = lsa[OSPF_LSASUMMARY_LEN:] ; cnt = 0 ; metrics = {}
-    while len(lsa) > 0:
-        cnt += 1
+    metrics = {}
+    while off < end:
+        (tos, stub, metric) = OSPF_METRIC_ST.unpack_from(buf, off)
+        metrics[tos] = ((stub << 16) | metric)
+        off += OSPF_METRIC_LEN
+
+    return { "MASK"    : mask,
+             "METRICS" : metrics
+    }
 
-        if verbose > 1: print prtbin((level+1)*INDENT, lsa[:OSPF_METRIC_LEN])
-        (tos, stub, metric) = struct.unpack(OSPF_METRIC, lsa[:OSPF_METRIC_LEN])
 
-        ## RFC 3137 "Stub routers": if (stub,metric) == (0xff, 0xffff)
-        ## then this is a stub router and it is attempting to
-        ## discourage other routers from using it to transit traffic,
-        ## ie. forward traffic to any networks others than those
-        ## connected directly
+def decodeOspfLsaExt(buf, off, end):
+    """
+    Decode the body of an AS-external (type 5) or NSSA (type 7) LSA,
+    both share the same layout.
+    """
+    (mask, ) = OSPF_LSAEXT_ST.unpack_from(buf, off)
+    off += OSPF_LSAEXT_LEN
+
+    metrics = {}
+    while off < end:
+        (exttos, stub, metric, fwd, tag, ) = OSPF_LSAEXT_METRIC_ST.unpack_from(buf, off)
+        metrics[exttos & 0x7f] = { "EXT"    : ((exttos & 0xf0) >> 7) * "E",
+                                   "METRIC" : ((stub << 16) | metric),
+                                   "FWD"    : fwd,
+                                   "TAG"    : tag,
+                                   }
+        off += OSPF_LSAEXT_METRIC_LEN
 
-        metric = ((stub << 16) | metric)
-        if verbose > 0:
-            if metric == LS_STUB_RTR: mstr = "metric:STUB_ROUTER"
-            elif metric > LS_INFINITY: mstr = "*** metric:%s > LS_INFINITY! ***" % metric
-            elif metric == LS_INFINITY: mstr = "metric:LS_INFINITY"
-            else: mstr = "metric:%d" % metric
-            print (level+1)*INDENT + "%s: tos:%s, %s" % (cnt, tos, mstr)
+    return { "MASK": mask,
+             "METRICS": metrics,
+             }
 
-        metrics[tos] = metric
-        lsa = lsa[OSPF_METRIC_LEN:]
 
-    return { "MASK"    : mask,
-             "METRICS" : metrics
-    }
+def decodeOspfOpaque(buf, off, end):
+    #TODO:unimplemented
+    return {"ODATA": buf[off:end].tobytes()}
 
 
-def parseOspfLsaExt(lsa, verbose=1, level=0):
+def _te_prio(pri):
+    return dict([('P' + str(i), p) for i, p in enumerate(pri)])
 
-    if verbose > 1: print prtbin(level*INDENT, lsa[:OSPF_LSAEXT_LEN])
-    (mask, ) = struct.unpack(OSPF_LSAEXT, lsa[:OSPF_LSAEXT_LEN])
-    if verbose > 0: print level*INDENT + "mask:%s" % id2str(mask)
 
-    lsa = lsa[OSPF_LSAEXT_LEN:] ; cnt = 0 ; metrics = {}
-    while len(lsa) > 0:
+## TE TLVs (RFC 3630) as type: (key, struct, convert), see decodeTlvs.
 
-        if verbose > 1: print prtbin((level+1)*INDENT, lsa[:OSPF_LSAEXT_METRIC_LEN])
-        (exttos, stub, metric, fwd, tag, ) =\
-        struct.unpack(OSPF_LSAEXT_METRIC, lsa[:OSPF_LSAEXT_METRIC_LEN])
-        ext = ((exttos & 0xf0) >> 7) * "E"
-        tos = exttos & 0x7f
+TE_LINK_SUBTLVS = { 1: ("T", OSPF_TE_BYTE_ST, None),                 # link type
+                    2: ("ID", OSPF_TE_LONG_ST, None),                # link id
+                    3: ("LIP", OSPF_TE_LONG_ST, None),               # local interface ip addr
+                    4: ("RIP", OSPF_TE_LONG_ST, None),               # remote interface ip addr
+                    5: ("TEMETRIC", OSPF_TE_LONG_ST, None),          # traffic engineer metric
+                    6: ("MAXBW", OSPF_TE_FLOAT_ST, None),            # maximum bandwidth
+                    7: ("MAXRSVBW", OSPF_TE_FLOAT_ST, None),         # maximum reservable bandwidth
+                    8: ("UNRSVBW", OSPF_TE_PRIO_ST, _te_prio),       # unreserved bandwidth
+                    9: ("ADGRP", OSPF_TE_LONG_ST, None),             # administrative group
+                    32768: ("SUBPOOLBW", OSPF_TE_FLOAT_ST, None),
+                    32769: ("UNRSVSUBPOOLBW", OSPF_TE_PRIO_ST, _te_prio),
+                    32770: ("IGPMETRIC", OSPF_TE_LONG_ST, None),
+                    }
 
-        metric = ((stub << 16) | metric)
-        if verbose > 0:
-            if metric == LS_STUB_RTR: mstr = "metric:STUB_ROUTER"
-            elif metric > LS_INFINITY: mstr = "*** metric:%s > LS_INFINITY! ***" % metric
-            elif metric == LS_INFINITY: mstr = "metric:LS_INFINITY"
-            else: mstr = "metric:%d" % metric
-            print (level+1)*INDENT +\
-                  "%s: ext:%s, tos:%s, %s, fwd:%s, tag:0x%x" %(
-                      cnt, ext, int2bin(tos), mstr, id2str(fwd), tag)
 
-        metrics[tos] = { "EXT"    : ext,
-                         "METRIC" : metric,
-                         "FWD"    : fwd,
-                         "TAG"    : tag,
-                         }
+def decodeTeLink(buf, off, end):
+    return decodeTlvs(buf, off, end, TE_LINK_SUBTLVS)
 
-        lsa = lsa[OSPF_LSAEXT_METRIC_LEN:]
-        cnt += 1
 
-    return { "MASK": mask,
-             "METRICS": metrics,
-             }
+TE_TLVS = { 1: ("RA", OSPF_TE_LONG_ST, None),       # router address
+            2: ("LNK", None, decodeTeLink),         # link, made of sub-TLVs
+            }
 
 
-def parseOspfOpaque9(lsa, verbose=1, level=0):
-    #TODO:unimplemented
-    return {"ODATA": lsa}
-
-
-def parseOspfOpaque10(lsa, verbose=1, level=0):
-    tlv = {}
-    while len(lsa) > 0:
-
-        (typ, length, ) = struct.unpack(OSPF_OPAQUE_TL, lsa[:OSPF_OPAQUE_TL_LEN])
-        lsa = lsa[OSPF_OPAQUE_TL_LEN:]
-
-        if TE_TLV_TS[typ] == 'ROUTER ADDRESS':        # Router Address
-            (rtr, ) = struct.unpack('> L', lsa[:length])
-            tlv['RA'] = rtr
-
-        elif TE_TLV_TS[typ] == 'LINK':      # Link Information
-            tlv['LNK'] = {}
-            while length > 0:
-                (sub_type, sub_len, ) = struct.unpack(OSPF_OPAQUE_TL, lsa[:OSPF_OPAQUE_TL_LEN])
-                lsa = lsa[OSPF_OPAQUE_TL_LEN:]
-                if not sub_type in TE_LINK_SUBTYPES:
-                    LOG.error('[ERROR] Type 10 LSA unknown sub-TLV, sub type is %s.' % sub_type)
-                else:
-                    if TE_LINK_SUBTYPES[sub_type] == 'TYPE':     # link type
-                        (link_type,) = struct.unpack('> B', lsa[:sub_len])
-                        #type 1 should pads 3 bytes
-                        tlv['LNK']['T'] = link_type
-                        sub_len += 3
-                    elif TE_LINK_SUBTYPES[sub_type] == 'ID':   # link id
-                        (link_id, ) = struct.unpack('> L', lsa[:sub_len])
-                        tlv['LNK']['ID'] = link_id
-                    elif TE_LINK_SUBTYPES[sub_type] == 'LOCAL IF':   # local interface ip addr
-                        (local_ip, ) = struct.unpack('> L', lsa[:sub_len])
-                        tlv['LNK']['LIP'] = local_ip
-                    elif TE_LINK_SUBTYPES[sub_type] == 'REMOTE IF':   # remote interface ip addr
-                        (remote_ip, ) = struct.unpack('> L', lsa[:sub_len])
-                        tlv['LNK']['RIP'] = remote_ip
-                    elif TE_LINK_SUBTYPES[sub_type] == 'TE METRIC':   # traffic engineer metric
-                        (te_metric, ) = struct.unpack('> L', lsa[:sub_len])
-                        tlv['LNK']['TEMETRIC'] = te_metric
-                    elif TE_LINK_SUBTYPES[sub_type] == 'MAX BW':   # maximum bandwidth
-                        (max_bw, ) = struct.unpack('> f', lsa[:sub_len])
-                        tlv['LNK']['MAXBW'] = max_bw
-                    elif TE_LINK_SUBTYPES[sub_type] == 'MAX RSVBL BW':   # maximum reservable bandwidth
-                        (max_rsv_bw, ) = struct.unpack('> f', lsa[:sub_len])
-                        tlv['LNK']['MAXRSVBW'] = max_rsv_bw
-                    elif TE_LINK_SUBTYPES[sub_type] == 'UNRSVD BW':   # unreservable bandwidth
-                        (p0, p1, p2, p3, p4, p5, p6, p7, ) \
-                            = struct.unpack('> f f f f f f f f', lsa[:sub_len])
-                        pri = (p0, p1, p2, p3, p4, p5, p6, p7)
-                        tlv['LNK']['UNRSVBW'] = {}
-                        for i in range(0, len(pri)):
-                            tlv['LNK']['UNRSVBW']['P'+str(i)] = pri[i]
-                    elif TE_LINK_SUBTYPES[sub_type] == 'ADMIN GROUP':   # administrative group
-                        (admin_grp, ) = struct.unpack('> L', lsa[:sub_len])
-                        tlv['LNK']['ADGRP'] = admin_grp
-                    elif TE_LINK_SUBTYPES[sub_type] == 'IGP METRIC':
-                        (igp_metric, ) = struct.unpack('> L', lsa[:sub_len])
-                        tlv['LNK']['IGPMETRIC'] = igp_metric
-                    elif TE_LINK_SUBTYPES[sub_type] == 'SUBPOOL BW':
-                        (max_rsv_subpool_bw, ) = struct.unpack('> f', lsa[:sub_len])
-                        tlv['LNK']['SUBPOOLBW'] = max_rsv_subpool_bw
-                    elif TE_LINK_SUBTYPES[sub_type] == 'UNRSVD SUBPOOL BW':
-                        (p0, p1, p2, p3, p4, p5, p6, p7, ) \
-                            = struct.unpack('> f f f f f f f f', lsa[:sub_len])
-                        pri = (p0, p1, p2, p3, p4, p5, p6, p7)
-                        tlv['LNK']['UNRSVSUBPOOLBW'] = {}
-                        for i in range(0, len(pri)):
-                            tlv['LNK']['UNRSVSUBPOOLBW']['P'+str(i)] = pri[i]
-                lsa = lsa[sub_len:]
-                length -= (sub_len + OSPF_OPAQUE_TL_LEN)
+def decodeTlvs(buf, off, end, table):
+    """
+    Decode TLVs between off and end with a {type: (key, struct, convert)}
+    table. The value is unpacked with struct and passed through convert if
+    it is set. Without struct, convert(buf, off, end) decodes the value, as
+    for TLVs made of sub-TLVs. A TLV of unknown type, or too short for its
+    struct, is kept as raw bytes in rv["UNKNOWN"][type]. Values are padded
+    to 4 bytes.
+    """
+    rv = {}
+    unpack_tl = OSPF_OPAQUE_TL_ST.unpack_from
+    while off + OSPF_OPAQUE_TL_LEN <= end:
+        (typ, length, ) = unpack_tl(buf, off)
+        off += OSPF_OPAQUE_TL_LEN
+        vend = min(off + length, end)
+
+        entry = table.get(typ)
+        if entry is not None and (entry[1] is None or vend - off >= entry[1].size):
+            key, st, convert = entry
+            if st is None:
+                rv[key] = convert(buf, off, vend)
+            elif convert is None:
+                (rv[key], ) = st.unpack_from(buf, off)
+            else:
+                rv[key] = convert(st.unpack_from(buf, off))
         else:
-            LOG.error('[ERROR] Type 10 LSA unknown TLV.')
-        lsa = lsa[length:]
+            LOG.debug('[ERROR] Unknown or malformed TLV, type is %s.' % typ)
+            rv.setdefault("UNKNOWN", {})[typ] = buf[off:vend].tobytes()
 
-    return tlv
+        off += (length + 3) & ~3
+    return rv
 
 
-def parseOspfOpaque11(lsa, verbose=1, level=0):
-    #TODO:unimplemented
-    return {"ODATA": lsa}
+def decodeOspfOpaque10(buf, off, end):
 
+    return decodeTlvs(buf, off, end, TE_TLVS)
 
-def parseOspfNssa(lsa, verbose=1, level=0):
-    if verbose > 1: print prtbin(level*INDENT, lsa[:OSPF_LSAEXT_LEN])
-    (mask, ) = struct.unpack(OSPF_LSAEXT, lsa[:OSPF_LSAEXT_LEN])
-    if verbose > 0: print level*INDENT + "mask:%s" % id2str(mask)
 
-    lsa = lsa[OSPF_LSAEXT_LEN:] ; cnt = 0 ; metrics = {}
-    while len(lsa) > 0:
+def decodeOspfLsaBody(t, buf, off, end):
+    """
+    Decode an LSA body according to its LS type, None for an unknown type.
+    """
+    decoder = LSA_DECODERS.get(t)
+    if decoder is None:
+        LOG.debug('[ERROR] Unknown LSU type.')
+        return None
+    return decoder(buf, off, end)
 
-        if verbose > 1: print prtbin((level+1)*INDENT, lsa[:OSPF_LSAEXT_METRIC_LEN])
-        (exttos, stub, metric, fwd, tag, ) =\
-        struct.unpack(OSPF_LSAEXT_METRIC, lsa[:OSPF_LSAEXT_METRIC_LEN])
-        ext = ((exttos & 0xf0) >> 7) * "E"
-        tos = exttos & 0x7f
 
-        metric = ((stub<<16) | metric)
+class LazyLsa(dict):
+    """
+    An LSA as returned in an LSU: {"H": header, "T": type, "L": length, "V": body}.
 
-        if verbose > 0:
-            if metric == LS_STUB_RTR: mstr = "metric:STUB_ROUTER"
-            elif metric > LS_INFINITY: mstr = "*** metric:%s > LS_INFINITY! ***" % metric
-            elif metric == LS_INFINITY: mstr = "metric:LS_INFINITY"
-            else: mstr = "metric:%d" % metric
-            print (level+1)*INDENT +\
-                  "%s: ext:%s, tos:%s, %s, fwd:%s, tag:0x%x" %(
-                      cnt, ext, int2bin(tos), mstr, id2str(fwd), tag)
+    The header is decoded eagerly, while the body is kept as raw bytes and
+    only decoded the first time lsa["V"] is read. An LSA which is dropped by
+    flooding, or which replaces an identical copy in the LSDB, never has its
+    body decoded. The raw body is kept after decoding, it is what is sent
+    when a neighbor requests the LSA.
+    """
 
-        metrics[tos] = { "EXT"    : ext,
-                         "METRIC" : metric,
-                         "FWD"    : fwd,
-                         "TAG"    : tag,
-                         }
+    bad = False     # set when the body failed to decode
 
-        lsa = lsa[OSPF_LSAEXT_METRIC_LEN:]
-        cnt += 1
+    def __init__(self, hdr, raw=None):
+        dict.__init__(self, H=hdr, T=hdr["T"], L=hdr["L"])
+        self.raw = raw
 
-    return { "MASK": mask,
-             "METRICS": metrics,
-             }
+    def __missing__(self, key):
+        raw = self.raw
+        if key != "V" or raw is None or self.bad:
+            raise KeyError(key)
+        try:
+            body = decodeOspfLsaBody(self["T"], memoryview(raw), 0, len(raw))
+        except Exception, e:
+            LOG.error('[ERROR] LSA body decode error: %s.' % e)
+            body = None
+        if body is None:
+            self.bad = True
+            raise KeyError(key)
+        self["V"] = body
+        return body
+
+    def decode(self):
+        """
+        Decode the body if it is still raw, return the LSA itself.
+        """
+        if "V" not in self:
+            try:
+                self["V"]
+            except KeyError:
+                pass
+        return self
+
+
+class LsaCache(object):
+    """
+    Bounded LRU cache of checksum-verified LSAs from received LSUs, keyed by
+    the LSA instance identity (type, lsid, advrtr, seqno, cksum). An entry
+    is only reused when the LSA bytes after the age field are identical.
+    """
+
+    def __init__(self, size=LSA_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lsas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, data):
+        """
+        Return the cached LSA for key, or None if it is missing or its bytes
+        differ from data.
+        """
+        if self.size <= 0:
+            return None
+        with self._lock:
+            entry = self._lsas.pop(key, None)
+            if entry is not None and data == entry[0]:
+                self._lsas[key] = entry
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, data, lsa):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._lsas[key] = (data, lsa)
+            while len(self._lsas) > self.size:
+                self._lsas.popitem(last=False)
 
+    def resize(self, size):
+        with self._lock:
+            self.size = size
+            while len(self._lsas) > max(size, 0):
+                self._lsas.popitem(last=False)
 
-def parseOspfLsas(lsas, verbose=1, level=0):
+    def clear(self):
+        with self._lock:
+            self._lsas.clear()
+
+    def __len__(self):
+        return len(self._lsas)
+
+
+LSA_CACHE = LsaCache()
+
+
+def decodeOspfLsas(buf, off, end, lazy=True):
     rv = {}
 
     cnt = 0
-    while len(lsas) > 0:
+    while off < end:
         cnt += 1
-        rv[cnt] = {}
-
-        if verbose > 0: print level*INDENT + "LSA %s" % cnt
-        rv[cnt]["H"] = parseOspfLsaHdr(lsas[:OSPF_LSAHDR_LEN], verbose, level+1)
 
-        t = rv[cnt]["H"]["T"]
-        l = rv[cnt]["H"]["L"]
-        rv[cnt]["T"] = t
-        rv[cnt]["L"] = l
+        hdr = decodeOspfLsaHdr(buf, off)
+        rv[cnt] = lsa = LazyLsa(hdr)
+
+        t = hdr["T"]
+        l = hdr["L"]
+        if l < OSPF_LSAHDR_LEN:
+            LOG.error('[ERROR] LSA length error.')
+            break
+
+        #A byte-identical instance seen before is already verified and maybe decoded.
+        key = (t, hdr["LSID"], hdr["ADVRTR"], hdr["LSSEQNO"], hdr["CKSUM"])
+        data = buf[off+2:off+l]     # leave out age
+        cached = LSA_CACHE.get(key, data)
+        if cached is not None:
+            lsa.raw = cached.raw
+            if "V" in cached:
+                lsa["V"] = cached["V"]
+            elif not lazy:
+                lsa.decode()
+            off += l
+            continue
 
-        cksum = lsa_checksum(lsas[:l])
+        cksum = lsa_checksum(buf[off:off+l])
         if cksum:
             LOG.error('[ERROR] LSA checksum error.')
-            lsas = lsas[l:]
+            off += l
             continue
 
-        if LSA_TYPES[t] == 'ROUTER':
-            rv[cnt]["V"] = parseOspfLsaRtr(lsas[OSPF_LSAHDR_LEN:l], verbose, level+1)
-        elif LSA_TYPES[t] == 'NETWORK':
-            rv[cnt]["V"] = parseOspfLsaNet(lsas[OSPF_LSAHDR_LEN:l], verbose, level+1)
-        elif LSA_TYPES[t] == 'SUMMARY (IP)':
-            rv[cnt]["V"] = parseOspfLsaSummary(lsas[OSPF_LSAHDR_LEN:l], verbose, level+1)
-        elif LSA_TYPES[t] == 'SUMMARY (ASBR)':
-            rv[cnt]["V"] = parseOspfLsaSummary(lsas[OSPF_LSAHDR_LEN:l], verbose, level+1)
-        elif LSA_TYPES[t] == 'EXTERNAL AS':
-            rv[cnt]["V"] = parseOspfLsaExt(lsas[OSPF_LSAHDR_LEN:l], verbose, level+1)
-        elif LSA_TYPES[t] == 'NSSA':
-            rv[cnt]["V"] = parseOspfNssa(lsas[OSPF_LSAHDR_LEN:l], verbose, level+1)
-        elif LSA_TYPES[t] == 'OPAQUE LINK LOCAL':
-            rv[cnt]["V"] = parseOspfOpaque9(lsas[OSPF_LSAHDR_LEN:l], verbose, level+1)
-        elif LSA_TYPES[t] == 'OPAQUE AREA LOCAL':
-            rv[cnt]["V"] = parseOspfOpaque10(lsas[OSPF_LSAHDR_LEN:l], verbose, level+1)
-        elif LSA_TYPES[t] == 'OPAQUE AS LOCAL':
-            rv[cnt]["V"] = parseOspfOpaque11(lsas[OSPF_LSAHDR_LEN:l], verbose, level+1)
-        else:
-            LOG.debug('[ERROR] Unknown LSU type.')
+        lsa.raw = buf[off+OSPF_LSAHDR_LEN:off+l].tobytes()
+        if not lazy:
+            body = decodeOspfLsaBody(t, buf, off + OSPF_LSAHDR_LEN, off + l)
+            if body is not None:
+                lsa["V"] = body
+        LSA_CACHE.put(key, data.tobytes(), lsa)
 
-        lsas = lsas[l:]
+        off += l
 
     return rv
 
 
-def parseOspfHello(msg, verbose=1, level=0):
-    if verbose > 1: print prtbin(level*INDENT, msg)
-    (netmask, hello, opts, prio, dead, desig, bdesig) = struct.unpack(OSPF_HELLO, msg[:OSPF_HELLO_LEN])
-    if verbose > 0:
-        print level*INDENT +\
-              "HELLO: netmask:%s, hello intvl:%s, opts:%s, prio:%s, dead intvl:%s" %\
-              (id2str(netmask), hello, opts, prio, dead)
-        print (level+1)*INDENT +\
-              "designated rtr:%s, backup designated rtr:%s" %\
-              (id2str(desig), id2str(bdesig))
-
-    msg = msg[OSPF_HELLO_LEN:] ; nbor_len = struct.calcsize(">L") ; nbors = []
-
-    while len(msg) > 0:
-        if verbose > 1: print prtbin(level*INDENT, msg[:nbor_len])
-        (nbor,) = struct.unpack(">L", msg[:nbor_len])
-        if verbose > 0:
-            print (level+1)*INDENT + "neighbour: %s" % (id2str(nbor),)
+def decodeOspfHello(buf, off, end):
+    (netmask, hello, opts, prio, dead, desig, bdesig) = OSPF_HELLO_ST.unpack_from(buf, off)
+    off += OSPF_HELLO_LEN
+
+    nbors = []
+    while off < end:
+        (nbor, ) = OSPF_NBOR_ST.unpack_from(buf, off)
         nbors.append(nbor)
-        msg = msg[nbor_len:]
+        off += OSPF_NBOR_LEN
 
     return { "NETMASK" : netmask,
              "HELLO"   : hello,
-             "OPTS"    : parseOspfOpts(opts, verbose, level),
+             "OPTS"    : decodeOspfOpts(opts),
              "PRIO"    : prio,
              "DEAD"    : dead,
              "DESIG"   : desig,
@@ -660,101 +677,156 @@ def parseOspfHello(msg, verbose=1, level=0):
     }
 
 
-def parseOspfDesc(msg, verbose=1, level=0):
-    if verbose > 0: print prtbin(level*INDENT, msg)
-    (mtu, opts, imms, ddseqno) = struct.unpack(OSPF_DESC, msg[:OSPF_DESC_LEN])
-
-    init        = (imms & 0x04) >> 2
-    more        = (imms & 0x02) >> 1
-    masterslave = (imms & 0x01)
-    if verbose > 0:
-        print level * INDENT + \
-              "DESC: mtu:%s, opts:%s, imms:%s%s%s%s, dd seqno:%s" % \
-              (mtu, int2bin(opts), init*"INIT", more*" MORE", masterslave*" MASTER", (1-masterslave)*" SLAVE", ddseqno)
-
-    msg = msg[OSPF_DESC_LEN:]
-    cnt = 0 ; lsas = {}
-    while len(msg) > 0:
-        cnt += 1
-        if verbose > 0: print (level+1)*INDENT + "LSA %s" % cnt
-        lsas[cnt] = parseOspfLsaHdr(msg[:OSPF_LSAHDR_LEN], verbose, level+1)
-        msg = msg[OSPF_LSAHDR_LEN:]
+def decodeOspfDesc(buf, off, end):
+    (mtu, opts, imms, ddseqno) = OSPF_DESC_ST.unpack_from(buf, off)
 
     return { "MTU"         : mtu,
-             "OPTS"        : parseOspfOpts(opts, verbose, level),
-             "INIT"        : init,
-             "MORE"        : more,
-             "MS"          : masterslave,
+             "OPTS"        : decodeOspfOpts(opts),
+             "INIT"        : (imms & 0x04) >> 2,
+             "MORE"        : (imms & 0x02) >> 1,
+             "MS"          : (imms & 0x01),
              "DDSEQ"       : ddseqno,
-             "LSAS"        : lsas
+             "LSAS"        : decodeOspfLsaHdrs(buf, off + OSPF_DESC_LEN, end)
              }
 
 
-def parseOspfLsReq(msg, verbose=1, level=0):
-    #TODO:unimplemented
-    return None
+def decodeOspfLsReqs(buf, off, end):
+    """
+    Decode the requests of an LSR into a list of (type, lsid, advrtr).
+    """
+    n = (end - off) // OSPF_LSREQ_LEN
+    lsrs = [None] * n
+    unpack = OSPF_LSREQ_ST.unpack_from
+    for i in xrange(n):
+        lsrs[i] = unpack(buf, off + i * OSPF_LSREQ_LEN)
+    return lsrs
 
 
-def parseOspfLsUpd(msg, verbose=1, level=0):
+def decodeOspfLsReq(buf, off, end):
 
-    if verbose > 1: print prtbin(level*INDENT, msg[:OSPF_LSUPD_LEN])
-    (nlsas, ) = struct.unpack(OSPF_LSUPD, msg[:OSPF_LSUPD_LEN])
-    if verbose > 0:
-        print level*INDENT + "LSUPD: nlsas:%s" % (nlsas)
+    return { "LSRS"  : decodeOspfLsReqs(buf, off, end)}
+
+
+def decodeOspfLsUpd(buf, off, end, lazy=True):
+
+    (nlsas, ) = OSPF_LSUPD_ST.unpack_from(buf, off)
 
     return { "NLSAS" : nlsas,
-             "LSAS"  : parseOspfLsas(msg[OSPF_LSUPD_LEN:], verbose, level+1),
+             "LSAS"  : decodeOspfLsas(buf, off + OSPF_LSUPD_LEN, end, lazy),
              }
 
 
-def parseOspfLsAck(msg, verbose=1, level=0):
+def decodeOspfLsAck(buf, off, end):
 
-    if verbose > 0: print level*INDENT + "LSACK"
+    return { "LSAS"  : decodeOspfLsaHdrs(buf, off, end)}
 
-    cnt = 0 ; lsas = {}
-    while len(msg) > 0:
-        cnt += 1
-        if verbose > 0: print (level+1)*INDENT + "LSA %s" % cnt
-        lsas[cnt] = parseOspfLsaHdr(msg[:OSPF_LSAHDR_LEN], verbose, level+1)
-        msg = msg[OSPF_LSAHDR_LEN:]
 
-    return { "LSAS"  : lsas}
+LSA_DECODERS = { 1: decodeOspfLsaRtr,
+                 2: decodeOspfLsaNet,
+                 3: decodeOspfLsaSummary,
+                 4: decodeOspfLsaSummary,
+                 5: decodeOspfLsaExt,
+                 7: decodeOspfLsaExt,
+                 9: decodeOspfOpaque,
+                 10: decodeOspfOpaque10,
+                 11: decodeOspfOpaque,
+                 }
 
+MSG_DECODERS = { 1: decodeOspfHello,
+                 2: decodeOspfDesc,
+                 3: decodeOspfLsReq,
+                 4: decodeOspfLsUpd,
+                 5: decodeOspfLsAck,
+                 }
 
-def parseOspfMsg(msg, verbose=1, level=0):
 
-    iph = parseIpHdr(msg[:IP_HDR_LEN], verbose, level)
-    if not iph:
-        return None
-    msg = msg[IP_HDR_LEN:]
+def decodeOspfMsg(msg, lazy=True):
 
-    if dpkt.in_cksum(msg):
+    buf = memoryview(msg)
+    iph = decodeIpHdr(buf, 0)
+
+    if dpkt.in_cksum(msg[IP_HDR_LEN:]):
         LOG.error('[ERROR] OSPF header checksum error.')
         return None
 
-    ospfh = parseOspfHdr(msg[:OSPF_HDR_LEN], verbose, level+1)
+    ospfh = decodeOspfHdr(buf, IP_HDR_LEN)
     rv = { "T": ospfh["TYPE"],
            "L": ospfh["LEN"],
            "H": iph,
            "V": ospfh,
            }
 
-    if MSG_TYPES[ospfh["TYPE"]] == "HELLO":
-        rv["V"]["V"] = parseOspfHello(msg[OSPF_HDR_LEN:ospfh["LEN"]], verbose, level+2)
+    #The body ends at the OSPF packet length, any authentication trailer follows it.
+    decoder = MSG_DECODERS.get(ospfh["TYPE"])
+    if decoder is not None:
+        end = min(IP_HDR_LEN + ospfh["LEN"], len(buf))
+        rv["V"]["V"] = body = decoder(buf, IP_HDR_LEN + OSPF_HDR_LEN, end)
+        if not lazy and ospfh["TYPE"] == 4:
+            for lsa in body["LSAS"].itervalues():
+                lsa.decode()
 
-    elif MSG_TYPES[ospfh["TYPE"]] == "DBDESC":
-        rv["V"]["V"] = parseOspfDesc(msg[OSPF_HDR_LEN:ospfh["LEN"]], verbose, level+2)
+    return rv
 
-    elif MSG_TYPES[ospfh["TYPE"]] == "LSREQ":
-        rv["V"]["V"] = parseOspfLsReq(msg[OSPF_HDR_LEN:], verbose, level+1)
 
-    elif MSG_TYPES[ospfh["TYPE"]] == "LSUPD":
-        rv["V"]["V"] = parseOspfLsUpd(msg[OSPF_HDR_LEN:], verbose, level+2)
+def peekOspfType(msg):
+    """
+    The OSPF packet type of a raw IP/OSPF packet, without decoding it.
+    """
+    if len(msg) <= IP_HDR_LEN + 1:
+        return None
+    return ord(msg[IP_HDR_LEN + 1])
 
-    elif MSG_TYPES[ospfh["TYPE"]] == "LSACK":
-        rv["V"]["V"] = parseOspfLsAck(msg[OSPF_HDR_LEN:], verbose, level+2)
 
-    return rv
+def decodeOspfLsReqMsg(msg):
+    """
+    Fast path for LSR packets: return (dst, rid, aid, requests) with the
+    requests as decodeOspfLsReqs returns them, or None if the OSPF checksum
+    is wrong. No header dicts are built.
+    """
+    buf = memoryview(msg)
+    if dpkt.in_cksum(msg[IP_HDR_LEN:]):
+        LOG.error('[ERROR] OSPF header checksum error.')
+        return None
+
+    (_, _, _, _, _, _, _, _, _, dst) = IP_HDR_ST.unpack_from(buf, 0)
+    (_, _, length, rid, aid, _, _, _, _) = OSPF_HDR_ST.unpack_from(buf, IP_HDR_LEN)
+    end = min(IP_HDR_LEN + length, len(buf))
+    return dst, rid, aid, decodeOspfLsReqs(buf, IP_HDR_LEN + OSPF_HDR_LEN, end)
+
+
+def _fletcher_sums_py(data):
+    """
+    Fletcher sums (c0, c1) of data modulo 255, without a per-byte loop.
+
+    c0 is the plain byte sum. For c1, the sum of all running c0 values,
+    data is read as a base-256 integer X: since 256 = 1 + 255, each power
+    256**e is 1 + 255*e modulo 255**2, so X % 255**2 equals
+    c0 + 255 * (c1 - c0) modulo 255**2, from which c1 is recovered.
+    """
+    c0 = sum(bytearray(data))
+    r = int(hexlify(data) or '0', 16) % 65025
+    c0m = c0 % 255
+    c1 = ((r - c0m) // 255 - c0 // 255 + c0) % 255
+    return c0m, c1
+
+
+def _fletcher_sums_numpy(data):
+    """
+    Fletcher sums (c0, c1) of data modulo 255, using NumPy: c1 is the dot
+    product of the bytes with the weights n, n-1, ..., 1.
+    """
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    a = numpy.frombuffer(data, dtype=numpy.uint8)
+    n = len(a)
+    c0 = int(a.sum())
+    c1 = int(numpy.dot(_CKSUM_WEIGHTS[len(_CKSUM_WEIGHTS) - n:], a))
+    return c0 % 255, c1 % 255
+
+
+if numpy is not None:
+    # Weights 65535 ... 1, the tail of length n gives n ... 1 for any LSA.
+    _CKSUM_WEIGHTS = numpy.arange(65535, 0, -1, dtype=numpy.int64)
 
 
 def lsa_checksum(lsa):
@@ -765,12 +837,11 @@ def lsa_checksum(lsa):
     CHKSUM_OFFSET = 16
     if len(lsa) < CHKSUM_OFFSET:
         return None
-    c0 = c1 = 0
-    for char in lsa[2:]:   # leave out age
-        c0 += ord(char)
-        c1 += c0
-    c0 %= 255
-    c1 %= 255
+    # leave out age
+    if numpy is not None and len(lsa) >= CKSUM_NUMPY_MIN_LEN:
+        c0, c1 = _fletcher_sums_numpy(lsa[2:])
+    else:
+        c0, c1 = _fletcher_sums_py(lsa[2:])
 
     return (c1 << 8) + c0
 
@@ -778,15 +849,31 @@ def lsa_checksum(lsa):
 class OspfParser(object):
 
     @staticmethod
-    def parse(packet, verbose=0, level=0):
+    def parse(packet, lazy=True):
+        """
+        Parse a raw IP/OSPF packet. With lazy, LSA bodies in an LSU are left
+        raw until they are read.
+        """
         try:
             (msg_len, msg) = len(packet), packet
         except Exception, e:
             LOG.error(e)
             return None
         try:
-            rv = parseOspfMsg(msg, verbose, level)
-            return rv
+            return decodeOspfMsg(msg, lazy)
+        except Exception, e:
+            LOG.error(e)
+            LOG.error(traceback.format_exc())
+            return None
+
+    @staticmethod
+    def parse_lsr(packet):
+        """
+        Parse a raw IP/OSPF LSR packet into (dst, rid, aid, requests), see
+        decodeOspfLsReqMsg.
+        """
+        try:
+            return decodeOspfLsReqMsg(packet)
         except Exception, e:
             LOG.error(e)
             LOG.error(traceback.format_exc())
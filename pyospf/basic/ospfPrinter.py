@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Human readable display of packets decoded by OspfParser.
+
+The format* functions work on the structures returned by OspfParser.parse
+and return lists of text lines, they never touch the wire bytes and never
+modify the packet. PacketPrinter writes them to stdout from its own thread.
+"""
+
+import sys
+import logging
+import threading
+import Queue
+
+from pyospf.basic.ospfParser import *
+from pyospf.utils.util import id2str, int2bin
+
+
+LOG = logging.getLogger(__name__)
+
+INDENT = "    "
+
+# Decoded packets waiting to be printed, the receiver drops beyond this.
+PRINT_QUEUE_SIZE = 1000
+
+
+def _metric_str(metric):
+    if metric == LS_STUB_RTR:
+        return "metric:STUB_ROUTER"
+    elif metric > LS_INFINITY:
+        return "*** metric:%s > LS_INFINITY! ***" % metric
+    elif metric == LS_INFINITY:
+        return "metric:LS_INFINITY"
+    return "metric:%d" % metric
+
+
+def formatIpHdr(iph, level=0):
+    return [level*INDENT + "IP (len=%d)" % iph["IPLEN"],
+            (level+1)*INDENT +
+            "ver:%s, hlen:%s, tos:%s, len:%s, id:%s, frag:%s, ttl:%s, prot:%s, cksm:%x" %
+            (iph["VER"], iph["HLEN"], int2bin(iph["TOS"]), iph["IPLEN"], iph["IPID"],
+             iph["FRAG"], iph["TTL"], iph["PROTO"], iph["CKSUM"]),
+            (level+1)*INDENT + "src:%s, dst:%s" % (id2str(iph["SRC"]), id2str(iph["DST"])),
+            ]
+
+
+def formatOspfHdr(ospfh, level=0):
+    return [level*INDENT +
+            "OSPF: ver:%s, type:%s, len:%s, rtr id:%s, area id:%s, cksum:%x, autype:%s" %
+            (ospfh["VER"], MSG_TYPES.get(ospfh["TYPE"], ospfh["TYPE"]), ospfh["LEN"],
+             id2str(ospfh["RID"]), id2str(ospfh["AID"]), ospfh["CKSUM"],
+             AU_TYPES.get(ospfh["AUTYPE"], ospfh["AUTYPE"]))]
+
+
+def formatOspfOpts(opts, level=0):
+    return [level*INDENT + "options: %s %s %s %s %s %s %s %s" % (
+        opts["Q"]*"Q", opts["E"]*"E", opts["MC"]*"MC", opts["NP"]*"NP",
+        opts["L"]*"L", opts["DC"]*"DC", opts["O"]*"O", opts["DN"]*"DN")]
+
+
+def formatOspfLsaHdr(hdr, level=0):
+    """
+    Format an LSA header, either the dict of an LSU LSA or a LsaHdr.
+    """
+    if isinstance(hdr, LsaHdr):
+        hdr = { "AGE"     : hdr.age & 0x7FFF,
+                "OPTS"    : decodeOspfOpts(hdr.opts),
+                "T"       : hdr.type,
+                "LSID"    : hdr.lsid,
+                "ADVRTR"  : hdr.advrtr,
+                "LSSEQNO" : hdr.seqno,
+                "CKSUM"   : hdr.cksum,
+                "L"       : hdr.length,
+                }
+    lines = [level*INDENT +
+             "age:%s, type:%s, lsid:%s, advrtr:%s, lsseqno:%s, cksum:%x, len:%s" % (
+                 hdr["AGE"], LSA_TYPES.get(hdr["T"], hdr["T"]), id2str(hdr["LSID"]),
+                 id2str(hdr["ADVRTR"]), hdr["LSSEQNO"], hdr["CKSUM"], hdr["L"])]
+    return lines + formatOspfOpts(hdr["OPTS"], level)
+
+
+def formatOspfLsaHdrs(hdrs, level=0):
+    lines = []
+    for cnt, hdr in enumerate(hdrs, 1):
+        lines.append(level*INDENT + "LSA %s" % cnt)
+        lines.extend(formatOspfLsaHdr(hdr, level+1))
+    return lines
+
+
+def formatOspfLsaRtr(body, level=0):
+    lines = [level*INDENT + "nlinks:%s, rtr desc: %s %s %s" % (
+        body["NLINKS"], body["VIRTUAL"]*"VIRTUAL", body["EXTERNAL"]*"EXTERNAL",
+        body["BORDER"]*"BORDER")]
+    for i in sorted(body["LINKS"]):
+        link = body["LINKS"][i]
+        lines.append((level+1)*INDENT +
+                     "%s: link id:%s, link data:%s, link type:%s, ntos:%s, metric:%s" % (
+                         i, id2str(link["ID"]), id2str(link["DATA"]),
+                         RTR_LINK_TYPE.get(link["T"], link["T"]), link["NTOS"],
+                         link["METRICS"][0]))
+        for j, tos in enumerate(sorted(t for t in link["METRICS"] if t), 1):
+            lines.append((level+2)*INDENT + "%s: tos:%s, metric:%s" % (
+                j, int2bin(tos), link["METRICS"][tos]))
+    return lines
+
+
+def formatOspfLsaNet(body, level=0):
+    lines = [level*INDENT + "mask:%s" % id2str(body["MASK"])]
+    for cnt, rtr in enumerate(body["RTRS"], 1):
+        lines.append((level+1)*INDENT + "%s: attached rtr:%s" % (cnt, id2str(rtr)))
+    return lines
+
+
+def formatOspfLsaSummary(body, level=0):
+    lines = [level*INDENT + "mask:%s" % id2str(body["MASK"])]
+    for cnt, tos in enumerate(sorted(body["METRICS"]), 1):
+        lines.append((level+1)*INDENT + "%s: tos:%s, %s" % (
+            cnt, tos, _metric_str(body["METRICS"][tos])))
+    return lines
+
+
+def formatOspfLsaExt(body, level=0):
+    lines = [level*INDENT + "mask:%s" % id2str(body["MASK"])]
+    for cnt, tos in enumerate(sorted(body["METRICS"])):
+        metric = body["METRICS"][tos]
+        lines.append((level+1)*INDENT + "%s: ext:%s, tos:%s, %s, fwd:%s, tag:0x%x" % (
+            cnt, metric["EXT"], int2bin(tos), _metric_str(metric["METRIC"]),
+            id2str(metric["FWD"]), metric["TAG"]))
+    return lines
+
+
+def formatOspfOpaque(body, level=0):
+    if "ODATA" in body:
+        return [level*INDENT + "opaque data: %s bytes" % len(body["ODATA"])]
+    return [level*INDENT + "%s: %s" % (k, body[k]) for k in sorted(body)]
+
+
+LSA_FORMATTERS = { 1: formatOspfLsaRtr,
+                   2: formatOspfLsaNet,
+                   3: formatOspfLsaSummary,
+                   4: formatOspfLsaSummary,
+                   5: formatOspfLsaExt,
+                   7: formatOspfLsaExt,
+                   9: formatOspfOpaque,
+                   10: formatOspfOpaque,
+                   11: formatOspfOpaque,
+                   }
+
+
+def _lsa_body(lsa):
+    """
+    The body of an LSU LSA. A body still raw in a LazyLsa is decoded here
+    without storing it, the LSA is shared with the protocol threads.
+    """
+    body = lsa.get("V")
+    raw = getattr(lsa, 'raw', None)
+    if body is None and raw is not None and not getattr(lsa, 'bad', False):
+        body = decodeOspfLsaBody(lsa["T"], memoryview(raw), 0, len(raw))
+    return body
+
+
+def formatOspfLsas(lsas, level=0):
+    lines = []
+    for cnt in sorted(lsas):
+        lsa = lsas[cnt]
+        lines.append(level*INDENT + "LSA %s" % cnt)
+        lines.extend(formatOspfLsaHdr(lsa["H"], level+1))
+        body = _lsa_body(lsa)
+        formatter = LSA_FORMATTERS.get(lsa["T"])
+        if body is not None and formatter is not None:
+            lines.extend(formatter(body, level+1))
+    return lines
+
+
+def formatOspfHello(body, level=0):
+    lines = [level*INDENT +
+             "HELLO: netmask:%s, hello intvl:%s, prio:%s, dead intvl:%s" %
+             (id2str(body["NETMASK"]), body["HELLO"], body["PRIO"], body["DEAD"]),
+             (level+1)*INDENT +
+             "designated rtr:%s, backup designated rtr:%s" %
+             (id2str(body["DESIG"]), id2str(body["BDESIG"]))]
+    lines.extend(formatOspfOpts(body["OPTS"], level+1))
+    for nbor in body["NBORS"]:
+        lines.append((level+1)*INDENT + "neighbour: %s" % id2str(nbor))
+    return lines
+
+
+def formatOspfDesc(body, level=0):
+    ms = body["MS"]
+    lines = [level*INDENT + "DESC: mtu:%s, imms:%s%s%s%s, dd seqno:%s" % (
+        body["MTU"], body["INIT"]*"INIT", body["MORE"]*" MORE", ms*" MASTER",
+        (1-ms)*" SLAVE", body["DDSEQ"])]
+    lines.extend(formatOspfOpts(body["OPTS"], level+1))
+    return lines + formatOspfLsaHdrs(body["LSAS"], level+1)
+
+
+def formatOspfLsReq(body, level=0):
+    lines = [level*INDENT + "LSREQ: nreqs:%s" % len(body["LSRS"])]
+    for cnt, (typ, lsid, advrtr) in enumerate(body["LSRS"], 1):
+        lines.append((level+1)*INDENT + "%s: type:%s, lsid:%s, advrtr:%s" % (
+            cnt, LSA_TYPES.get(typ, typ), id2str(lsid), id2str(advrtr)))
+    return lines
+
+
+def formatOspfLsUpd(body, level=0):
+    return [level*INDENT + "LSUPD: nlsas:%s" % body["NLSAS"]] +\
+        formatOspfLsas(body["LSAS"], level+1)
+
+
+def formatOspfLsAck(body, level=0):
+    return [level*INDENT + "LSACK"] + formatOspfLsaHdrs(body["LSAS"], level+1)
+
+
+MSG_FORMATTERS = { 1: formatOspfHello,
+                   2: formatOspfDesc,
+                   3: formatOspfLsReq,
+                   4: formatOspfLsUpd,
+                   5: formatOspfLsAck,
+                   }
+
+
+def formatOspfMsg(pkt, level=0):
+    """
+    Format a packet returned by OspfParser.parse into text lines.
+    """
+    ospfh = pkt["V"]
+    lines = formatIpHdr(pkt["H"], level) + formatOspfHdr(ospfh, level+1)
+    formatter = MSG_FORMATTERS.get(ospfh["TYPE"])
+    if formatter is not None and ospfh.get("V") is not None:
+        lines.extend(formatter(ospfh["V"], level+2))
+    return lines
+
+
+class PacketPrinter(object):
+    """
+    Prints decoded packets from a daemon thread, so that the receive thread
+    never blocks on stdout. Packets arriving while the queue is full are
+    dropped, and their number is printed before the next packet shown.
+    """
+
+    def __init__(self, size=PRINT_QUEUE_SIZE, out=None):
+        self.out = out or sys.stdout
+        self.dropped = 0
+        self._reported = 0
+        self._queue = Queue.Queue(size)
+        self._thread = threading.Thread(target=self._run, name='PacketPrinter')
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def put(self, pkt):
+        try:
+            self._queue.put_nowait(pkt)
+        except Queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            pkt = self._queue.get()
+            lines = []
+            dropped = self.dropped
+            if dropped != self._reported:
+                lines.append('[%d packets not displayed]' % (dropped - self._reported))
+                self._reported = dropped
+            try:
+                lines.extend(formatOspfMsg(pkt))
+            except Exception, e:
+                LOG.error('[ERROR] Packet display error: %s.' % e)
+            if lines:
+                self.out.write('\n'.join(lines) + '\n')
+                self.out.flush()
@@ -3,17 +3,55 @@
 
 
 import struct
+import ctypes
 import logging
 import socket
 
 from dpkt.ip import *
 
 from pyospf.utils.sock import RawSock
+from pyospf.utils.mmsg import SO_TIMESTAMPNS, SO_RXQ_OVFL
 from pyospf.basic.constant import *
+from pyospf.utils.util import ip2int
 
 
 LOG = logging.getLogger(__name__)
 
+SO_ATTACH_FILTER = 26
+SO_RCVBUFFORCE = 33
+
+#Classic BPF opcodes, see linux/filter.h.
+BPF_LD_W_ABS = 0x20     # A = word at [k]
+BPF_LD_W_IND = 0x40     # A = word at [X + k]
+BPF_LDX_B_MSH = 0xb1    # X = 4 * ([k] & 0xf)
+BPF_JEQ_K = 0x15        # pc += (A == k) ? jt : jf
+BPF_RET_K = 0x06        # accept k bytes, 0 drops
+
+BPF_INSN_ST = struct.Struct('HBBI')
+
+
+def ospf_filter(local_ip, area_id):
+    """
+    Classic BPF program for the OSPF raw socket, which sees packets from the
+    IP header on. It drops packets sent by local_ip, packets sent to
+    AllDRouters, which the probe never handles as it is never DR/BDR, and
+    packets of other areas than area_id. Return [(code, jt, jf, k)].
+    """
+    return [(BPF_LD_W_ABS, 0, 0, 12),                           # ip src
+            (BPF_JEQ_K, 6, 0, ip2int(local_ip)),
+            (BPF_LD_W_ABS, 0, 0, 16),                           # ip dst
+            (BPF_JEQ_K, 4, 0, ip2int(ALL_D_ROUTER)),
+            (BPF_LDX_B_MSH, 0, 0, 0),                           # ip header length
+            (BPF_LD_W_IND, 0, 0, 8),                            # ospf area id
+            (BPF_JEQ_K, 0, 1, ip2int(area_id)),
+            (BPF_RET_K, 0, 0, 0xFFFFFFFF),
+            (BPF_RET_K, 0, 0, 0),
+            ]
+
+
+#Drops every packet, for sockets which only send.
+DROP_FILTER = [(BPF_RET_K, 0, 0, 0)]
+
 
 class OspfSock(RawSock):
 
@@ -43,6 +81,61 @@ class OspfSock(RawSock):
     def bind_ospf_multicast_group(self, interface):
         self.sock.setsockopt(socket.SOL_SOCKET, 25, interface)  # 25 stands for socket.SO_BINDTODEVICE
 
+    def attach_ospf_filter(self, local_ip, area_id):
+        """
+        Attach ospf_filter to the socket, so that the kernel drops our own
+        and foreign-area packets before they are copied to userspace.
+        Return False when the system does not support socket filters.
+        """
+        LOG.debug('[Sock] Attach socket filter.')
+        return self._attach_filter(ospf_filter(local_ip, area_id))
+
+    def attach_drop_filter(self):
+        """
+        Attach DROP_FILTER to a socket which only sends, so that the kernel
+        does not queue a copy of every incoming OSPF packet on it.
+        Return False when the system does not support socket filters.
+        """
+        LOG.debug('[Sock] Attach drop filter.')
+        return self._attach_filter(DROP_FILTER)
+
+    def _attach_filter(self, prog):
+        insns = ctypes.create_string_buffer(''.join([BPF_INSN_ST.pack(*i) for i in prog]))
+        fprog = struct.pack('HP', len(prog), ctypes.addressof(insns))
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+            return True
+        except Exception, e:
+            LOG.warn('[Sock] Socket filter not attached: %s.' % e)
+            return False
+
+    def enable_rx_info(self):
+        """
+        Ask the kernel for the receive time and the socket drop count with
+        every datagram, read back by recv_batch.
+        """
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+            return True
+        except Exception, e:
+            LOG.warn('[Sock] Kernel timestamps and drop counts not enabled: %s.' % e)
+            return False
+
+    def set_recv_buffer(self, size):
+        """
+        Set SO_RCVBUF, beyond net.core.rmem_max when allowed to. Return
+        the size the kernel granted, which it doubles for bookkeeping.
+        """
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, size)
+        except Exception:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+        return self.get_recv_buffer()
+
+    def get_recv_buffer(self):
+        return self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+
     def drop_ospf_multicast_group(self, intf_ip=socket.INADDR_ANY):
         LOG.debug('[Sock] Drop multicast group.')
 
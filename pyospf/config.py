@@ -25,7 +25,15 @@ probe_opts = [
     cfg.StrOpt('link_type', help='OSPF network interface link type'),
     cfg.StrOpt('options', help='OSPF options'),
     cfg.IntOpt('rxmt_interval', help='OSPF retransmission interval'),
-    cfg.BoolOpt('packet_display', default=False, help='Switch of version received packet display')
+    cfg.BoolOpt('packet_display', default=False, help='Switch of version received packet display'),
+    cfg.IntOpt('lsa_cache_size', default=10000, help='Number of verified LSAs cached by the parser, 0 to disable'),
+    cfg.IntOpt('lsdb_change_log', default=10000, help='Number of LSDB changes kept for /lsdb/changes'),
+    cfg.IntOpt('send_flush_latency', default=10, help='Max milliseconds LSR/LSU/LSAck packets wait to be sent in one batch, 0 to send at once'),
+    cfg.IntOpt('lsu_queue_size', default=1000, help='Max LSUs waiting to be handled, 0 for no limit'),
+    cfg.StrOpt('lsu_queue_policy', default='block', help='When the LSU queue is full: block, drop-oldest or coalesce'),
+    cfg.IntOpt('lsu_workers', default=4, help='Threads handling LSUs, each neighbor\'s LSUs are handled in order by one at a time'),
+    cfg.IntOpt('recv_buffer', default=2097152, help='SO_RCVBUF of the OSPF socket in bytes, 0 for the system default'),
+    cfg.IntOpt('recv_batch', default=32, help='Max packets read from the OSPF socket per syscall, 1 to disable batching'),
 ]
 
 database_group = cfg.OptGroup(name='database', title='Database configuration')
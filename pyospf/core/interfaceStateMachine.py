@@ -2,11 +2,12 @@
 # -*- coding:utf-8 -*-
 
 
-import datetime
 import copy
 import logging
 
 from pyospf.protocols.hello import HelloProtocol
+from pyospf.core.ospfSender import OspfSender
+from pyospf.core.ospfLsdb import LSA_AGE_OUT
 from pyospf.basic.constant import *
 from pyospf.utils.timer import Timer
 from pyospf.utils.util import *
@@ -57,6 +58,7 @@ class ISM(object):
         #     self.multiAreaCap = True
         #     self.multiArea = ai.oi.config['multiArea']
 
+        self.sender = OspfSender(self)
         self.hp = HelloProtocol(self)
         self.ism = dict()
 
@@ -227,38 +229,39 @@ class ISM(object):
 
     def _lsa_age(self):
         """
-        Check all LSA age, and when LSA's age is MAXAGE, call aged handler
+        Remove the LSAs reaching MAXAGE, rfc chap. 14. Only the LSAs due are
+        looked at, the LSDB aging index yields them. An LSA is removed once
+        it is on no neighbor's retransmission list and no neighbor is in
+        Exchange or Loading, else it is tried again at the next step.
         """
-        for lslist in self.ai.oi.lsdb.lsdb.values():
-            tobe_removed = list()
-            if len(lslist) == 0:
+        lsdb = self.ai.oi.lsdb
+        now = monotonic()
+        nbrs = self.nbr_list.values()
+        exchanging = [n for n in nbrs if n.state in (NSM_STATE['NSM_Exchange'], NSM_STATE['NSM_Loading'])]
+        removed = 0
+        #one type at a time, flooding of the other types goes on meanwhile
+        for lsa_type, lslist in lsdb.lsdb.items():
+            aging = lsdb.aging[lsa_type]
+            if not aging.due(now):
                 continue
-            else:
-                self.ai.oi.lsdb.lsdb_lock.acquire()
-                for lsa in lslist:
-                    age = lslist[lsa]['H']['AGE']
-                    dna = lslist[lsa]['H']['DNA']
-                    lsa_ts = strptime(datetimeLock, lslist[lsa]['TIMESTAMP'])
-                    now_age = abs(lsa_ts - datetime.datetime.now()).seconds + age
-
-                    #Remove aged LSA, rfc chap. 14
-                    if dna == 0 and now_age >= MAXAGE:
-                        for nrid in self.nbr_list:
-                            if len(self.nbr_list[nrid].ls_rxmt) == 0 and\
-                               (self.nbr_list[nrid].state != NSM_STATE['NSM_Loading'] or
-                                self.nbr_list[nrid].state != NSM_STATE['NSM_Exchange']):
-                                tobe_removed.append(lsa)
-                self.ai.oi.lsdb.lsdb_lock.release()
-            tobe_removed = list(set(tobe_removed))
-
-            if len(tobe_removed) != 0:
-                LOG.info("[LSA] %s LSA(s) aged for reaching MAXAGE." % len(tobe_removed))
-                self.ai.oi.lsdb.lsdb_lock.acquire()
-                for rm in tobe_removed:
-                    #Maybe we received aged LSA in flood, then the LSA will be deleted by flood. If this, pass it.
-                    if rm not in lslist:
+            lsdb.locks[lsa_type].acquire()
+            try:
+                for (_, ls, lsa) in aging.expire(now):
+                    lsdb.rxmt_lock.acquire()
+                    retransmitting = [n for n in nbrs if lsa in n.ls_rxmt]
+                    lsdb.rxmt_lock.release()
+                    if exchanging or retransmitting:
+                        aging.add(lslist, ls, lsa, now + self.lsa_age_step)
                         continue
-                    del lslist[rm]
-                self.ai.oi.lsdb.lsdb_lock.release()
+                    del lslist[ls]
+                    #the change log shows the header the LSA is removed with
+                    lsdb.record(LSA_AGE_OUT, lsa_type, ls, {'H': dict(lsa['H'], AGE=MAXAGE)})
+                    removed += 1
+            finally:
+                lsdb.locks[lsa_type].release()
+
+        if removed != 0:
+            lsdb.publish()
+            LOG.info("[LSA] %s LSA(s) aged for reaching MAXAGE." % removed)
 
 
@@ -3,7 +3,6 @@
 
 
 import signal
-import time
 import logging
 
 from ospfArea import OspfArea
@@ -11,9 +10,11 @@ from ospfReceiver import OspfReceiver
 from ospfLsdb import OspfLsdb
 from ospfStat import OspfStat
 from pyospf.basic.ospfSock import OspfSock
+from pyospf.basic.ospfParser import LSA_CACHE
 from pyospf.basic.constant import ISM_STATE
 from pyospf.protocols.protocol import OspfProtocol
 from pyospf.utils import util
+from pyospf.utils.reactor import Reactor
 
 LOG = logging.getLogger(__name__)
 
@@ -64,11 +65,20 @@ class OspfInstance(object):
 
         self.lsdb = OspfLsdb(self)
 
-        self.recv = OspfReceiver(self.area.interface, self.area.interface.nbr_list, self.config['packet_display'])
+        self.recv = OspfReceiver(self.area.interface, self.area.interface.nbr_list, self.config['packet_display'],
+                                 self.config['lsu_queue_size'], self.config['lsu_queue_policy'],
+                                 self.config['lsu_workers'])
         self._sock = None   # socket for receiving ospf packets
+        self._batch = max(1, self.config['recv_batch'])
+        self._reactor = Reactor()
 
         # Statistics
         self.stat = OspfStat()
+        self.stat.lsu_queue = self.recv.lsu_handler
+        self.stat.recv_lanes = self.recv.lanes
+
+        LSA_CACHE.resize(self.config['lsa_cache_size'])
+        self.lsdb.resize_change_log(self.config['lsdb_change_log'])
 
     def run(self):
         """
@@ -84,18 +94,30 @@ class OspfInstance(object):
         self._sock = OspfSock()
         self._sock.bind_ospf_multicast_group(self.interface_mame)
         self._sock.add_ospf_multicast_group(self.local_ip)
+        #own and foreign-area packets are dropped in the kernel where supported
+        self._sock.attach_ospf_filter(self.local_ip, self.area.area_id)
+        self._sock.enable_rx_info()
+        if self.config['recv_buffer'] > 0:
+            self.stat.recv_buffer_size = self._sock.set_recv_buffer(self.config['recv_buffer'])
+        else:
+            self.stat.recv_buffer_size = self._sock.get_recv_buffer()
 
         # bind signal handler to handle terminal signal
         signal.signal(signal.SIGTERM, self.term_handler)
         signal.signal(signal.SIGINT, self.term_handler)
 
-        while True:
-            (data, src) = self._sock.recv()
-            (src_ip, port) = src
-            if src_ip == self.local_ip:       # filter to drop all packets from self
-                continue
+        #packets and timers are all handled from the reactor on this thread
+        self._reactor.add_reader(self._sock.sock.fileno(), self._readable)
+        self._reactor.run()
 
-            self.recv.ospf_handler(data, time.time())
+    def _readable(self):
+        for (data, src, timestamp) in self._sock.recv_batch(self._batch):
+            if src[0] == self.local_ip:       # filter to drop all packets from self
+                continue
+            self.recv.receive(data, timestamp)
+        self.recv.dispatch()
+        self.stat.recv_drop_count = self._sock.rx_dropped
+        self.stat.recv_trunc_count = self._sock.rx_truncated
 
     def term_handler(self, a, b):
         LOG.debug('[OSPF Instance] Signal %s is received.' % str(a))
@@ -104,5 +126,7 @@ class OspfInstance(object):
     def exit(self):
         self._sock.drop_ospf_multicast_group(self.local_ip)
         self._sock.close()
+        self.area.interface.sender.close()
+        self.recv.lsu_handler.shutdown(timeout=1)
         LOG.info('[OSPF Instance] Program exits.')
         exit(0)
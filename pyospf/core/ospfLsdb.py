@@ -1,12 +1,123 @@
 # !/usr/bin/env python
 # -*- coding:utf-8 -*-
 
+import heapq
 import logging
+import itertools
 import threading
 
+from collections import deque
+
+from pyospf.basic.constant import MAXAGE
+
 
 LOG = logging.getLogger(__name__)
 
+LSA_TYPE_NAME = {1: 'router', 2: 'network', 3: 'summary', 4: 'sum-asbr', 5: 'external',
+                 7: 'nssa', 9: 'opaque-9', 10: 'opaque-10', 11: 'opaque-11'}
+
+#The heap is rebuilt when replaced and deleted LSAs outnumber live ones by this.
+COMPACT_RATIO = 2
+
+#Buckets of an LSA type in a snapshot, a new snapshot copies the changed ones only.
+SNAPSHOT_BUCKETS = 64
+
+#Kinds of LSDB changes, as kept in the change log.
+LSA_ADD = 'add'                 # installed, none with its key before
+LSA_REPLACE = 'replace'         # installed over an older instance
+LSA_FLUSH = 'flush'             # removed on receiving it at MAXAGE
+LSA_AGE_OUT = 'age-out'         # removed on reaching MAXAGE here
+LSDB_CLEAR = 'clear'            # all LSAs of a type removed
+
+CHANGE_LOG_SIZE = 10000
+
+
+class LsdbSnapshot(object):
+    """
+    An immutable view of the LSDB as of a version, read without locking.
+    The LSAs of a type are spread over SNAPSHOT_BUCKETS dicts by key hash.
+    The next version copies the buckets which changed and shares all the
+    others with this one, nothing is changed in place.
+    """
+
+    __slots__ = ('version', 'seq', 'versions', '_buckets')
+
+    def __init__(self, version, seq, buckets, versions):
+        self.version = version
+        self.seq = seq              # sequence number of the last change in it
+        self.versions = versions    # {lsa type: version it last changed in}
+        self._buckets = buckets     # {lsa type: tuple of bucket dicts}
+
+    def types(self):
+        return self._buckets.keys()
+
+    def get(self, lsa_type, ls):
+        return self._buckets[lsa_type][hash(ls) % SNAPSHOT_BUCKETS].get(ls)
+
+    def items(self, lsa_type):
+        items = []
+        for bucket in self._buckets[lsa_type]:
+            items.extend(bucket.iteritems())
+        return items
+
+    def count(self, lsa_type):
+        return sum([len(bucket) for bucket in self._buckets[lsa_type]])
+
+
+class LsaAging(object):
+    """
+    Index of the LSDB LSAs by the time they reach MAXAGE, in a heap, so
+    that aging looks at the due LSAs only. Adding an LSA is O(log n). An
+    LSA replaced or deleted in its list stays in the heap until popped,
+    and the heap is rebuilt when such entries pile up. DoNotAge LSAs are
+    not indexed. Not thread safe, used under the lock of its type.
+    """
+
+    def __init__(self):
+        self._heap = list()         # [(expiry, seq, ls, lslist, lsa)]
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def add(self, lslist, ls, lsa, expiry=None):
+        """
+        Index lsa, stored as lslist[ls]. expiry is when it reaches MAXAGE
+        in util.monotonic() time, by default from its age and timestamp.
+        """
+        if lsa['H']['DNA']:
+            return
+        if expiry is None:
+            expiry = lsa['TIMESTAMP'] + MAXAGE - lsa['H']['AGE']
+        self._seq += 1
+        heapq.heappush(self._heap, (expiry, self._seq, ls, lslist, lsa))
+        if len(self._heap) > COMPACT_RATIO * len(lslist) + 64:
+            self._heap = [e for e in self._heap if e[3].get(e[2]) is e[4]]
+            heapq.heapify(self._heap)
+
+    def due(self, now):
+        """
+        Whether an LSA may have reached MAXAGE by now.
+        """
+        heap = self._heap
+        return len(heap) != 0 and heap[0][0] <= now
+
+    def expire(self, now):
+        """
+        Pop the LSAs which reached MAXAGE by now and are still in their list,
+        as [(lslist, ls, lsa)].
+        """
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            if entry[3].get(entry[2]) is entry[4]:
+                due.append((entry[3], entry[2], entry[4]))
+        return due
+
+    def clear(self):
+        self._heap = list()
+
 
 class OspfLsdb(object):
     """
@@ -33,15 +144,117 @@ class OspfLsdb(object):
             'opaque-11': oi.opaque11_lsa
         }
 
-        self.lsdb_lock = threading.RLock()
+        #Every LSA type has its own lock and aging index. A lock is held to
+        #change its list, readers use the snapshot. Locks of several types are
+        #taken in the order of their names.
+        self.locks = dict([(lsa_type, threading.Lock()) for lsa_type in self.lsdb])
+        self.aging = dict([(lsa_type, LsaAging()) for lsa_type in self.lsdb])
+        #the neighbors' ls_rxmt lists are changed when LSAs of any type are installed
+        self.rxmt_lock = threading.Lock()
+
+        #Changes are recorded by the writers and published as a new snapshot.
+        empty = (dict(),) * SNAPSHOT_BUCKETS
+        self.snapshot = LsdbSnapshot(0, 0, dict([(lsa_type, empty) for lsa_type in self.lsdb]),
+                                     dict([(lsa_type, 0) for lsa_type in self.lsdb]))
+        self._changes = deque()     # [(op, lsa type, ls, lsa)]
+        self._publish_lock = threading.Lock()
+
+        #The published changes, numbered from 1 on, the last CHANGE_LOG_SIZE kept.
+        self.seq = 0
+        self.change_log = deque(maxlen=CHANGE_LOG_SIZE)     # [(seq, op, lsa type, ls, lsa header)]
 
     def empty_lsdb(self):
-        self.lsdb_lock.acquire()
-        for lsa_type in self.lsdb:
-            self.lsdb[lsa_type].clear()
-        self.lsdb_lock.release()
+        names = sorted(self.lsdb)
+        for lsa_type in names:
+            self.locks[lsa_type].acquire()
+        try:
+            for lsa_type in names:
+                if self.lsdb[lsa_type]:
+                    self.lsdb[lsa_type].clear()
+                    self.record(LSDB_CLEAR, lsa_type)
+                self.aging[lsa_type].clear()
+        finally:
+            for lsa_type in reversed(names):
+                self.locks[lsa_type].release()
+        self.publish()
         LOG.info('[LSDB] Delete all LSAs in LSDB.')
 
+    def resize_change_log(self, size):
+        self._publish_lock.acquire()
+        self.change_log = deque(self.change_log, maxlen=max(0, size))
+        self._publish_lock.release()
+
+    def record(self, op, lsa_type, ls=None, lsa=None):
+        """
+        Record a change of lsdb[lsa_type][ls] for the next snapshot and the
+        change log: lsa set with LSA_ADD or LSA_REPLACE, lsa deleted with
+        LSA_FLUSH or LSA_AGE_OUT, or the whole list emptied with LSDB_CLEAR.
+        Called under the lock of the type, so the changes of a type
+        are recorded in the order they were made.
+        """
+        self._changes.append((op, lsa_type, ls, lsa))
+
+    def publish(self):
+        """
+        Make the changes recorded so far visible as a new snapshot, with one
+        attribute assignment, and append them to the change log. Return the
+        current snapshot.
+        """
+        self._publish_lock.acquire()
+        try:
+            old = self.snapshot
+            if not self._changes:
+                return old
+            buckets = dict()        # {lsa type: list of buckets}, for the types changed
+            copied = set()          # (lsa type, bucket index) already copied
+            for _ in xrange(len(self._changes)):
+                op, lsa_type, ls, lsa = self._changes.popleft()
+                self.seq += 1
+                self.change_log.append((self.seq, op, lsa_type, ls, lsa['H'] if lsa is not None else None))
+                if op == LSDB_CLEAR:
+                    buckets[lsa_type] = [dict() for _ in xrange(SNAPSHOT_BUCKETS)]
+                    copied.update([(lsa_type, i) for i in xrange(SNAPSHOT_BUCKETS)])
+                    continue
+                blist = buckets.get(lsa_type)
+                if blist is None:
+                    blist = buckets[lsa_type] = list(old._buckets[lsa_type])
+                i = hash(ls) % SNAPSHOT_BUCKETS
+                if (lsa_type, i) not in copied:
+                    blist[i] = dict(blist[i])
+                    copied.add((lsa_type, i))
+                if op == LSA_ADD or op == LSA_REPLACE:
+                    blist[i][ls] = lsa
+                else:
+                    blist[i].pop(ls, None)
+
+            version = old.version + 1
+            all_buckets = dict(old._buckets)
+            versions = dict(old.versions)
+            for lsa_type, blist in buckets.items():
+                all_buckets[lsa_type] = tuple(blist)
+                versions[lsa_type] = version
+            self.snapshot = LsdbSnapshot(version, self.seq, all_buckets, versions)
+            return self.snapshot
+        finally:
+            self._publish_lock.release()
+
+    def changes_since(self, seq):
+        """
+        The published changes after sequence number seq, oldest first, as
+        (last sequence number, [(seq, op, lsa type, ls, lsa header)]). The
+        list is None when changes after seq are no longer in the log, or seq
+        is unknown: the whole LSDB has to be read again.
+        """
+        self._publish_lock.acquire()
+        try:
+            last = self.seq
+            first = last - len(self.change_log) + 1
+            if seq > last or seq < first - 1:
+                return last, None
+            return last, list(itertools.islice(self.change_log, seq - first + 1, None))
+        finally:
+            self._publish_lock.release()
+
     def lookup_lsa_list(self, tp):
         """
         search the lsa should exist in which lsa list.
@@ -72,9 +285,4 @@ class OspfLsdb(object):
         """
         Translate LSA type number to name word.
         """
-        name = {1: 'router', 2: 'network', 3: 'summary', 4: 'sum-asbr', 5: 'external',
-                7: 'nssa', 9: 'opaque-9', 10: 'opaque-10', 11: 'opaque-11'}
-        if int(tp) in name:
-            return name[tp]
-        else:
-            return None
+        return LSA_TYPE_NAME.get(int(tp))
@@ -4,28 +4,149 @@
 
 import time
 import logging
+import traceback
+
+from collections import deque
 
 from pyospf.basic.ospfParser import *
+from pyospf.basic.ospfPrinter import PacketPrinter
 from pyospf.basic.constant import *
 
 from pyospf.utils import util
-from pyospf.utils.threadpool import ThreadPool
+from pyospf.utils.histogram import LatencyHistogram
+from pyospf.utils.reactor import Reactor
+from pyospf.utils.threadpool import ShardedThreadPool, DROP_OLDEST
+from pyospf.utils.timer import Timer
 
 
 LOG = logging.getLogger(__name__)
 
+#Hello and DD keep the adjacencies up, they are handled before anything else.
+HIGH_PRIO_TYPES = (1, 2)
+LANE_SIZE = 4096            # packets waiting in a lane or held, the oldest are dropped beyond
+DISPATCH_BUDGET = 64        # low priority packets handled between two socket reads
+STALL_RETRY = 0.01          # seconds between retries while the LSU queue is full
+
+
+class RecvLane(object):
+    """
+    Packets of one priority waiting to be handled, and how long they took
+    from the kernel receive timestamp until handled.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.queue = deque()
+        self.dropped = 0
+        self.max_depth = 0
+        self.latency = LatencyHistogram()
+
+    def put(self, data, timestamp):
+        if len(self.queue) >= LANE_SIZE:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append((data, timestamp))
+        self.max_depth = max(self.max_depth, len(self.queue))
+
+    def get_stat(self):
+        stat = self.latency.get_stat()
+        stat['depth'] = len(self.queue)
+        stat['max_depth'] = self.max_depth
+        stat['dropped'] = self.dropped
+        return stat
+
 
 class OspfReceiver(object):
 
-    def __init__(self, ism, nsm_list, pkt_display=False):
+    def __init__(self, ism, nsm_list, pkt_display=False, lsu_queue_size=0, lsu_queue_policy='block',
+                 lsu_workers=1):
         self.ism = ism
         self.nsm_list = nsm_list
 
-        self.pkt_dis = 0
+        #Packets are displayed from the printer thread, never inline.
+        self.printer = None
         if pkt_display:
-            self.pkt_dis = 1
+            self.printer = PacketPrinter()
+
+        #LSUs of one neighbor are handled in order, those of different neighbors concurrently.
+        self.lsu_handler = ShardedThreadPool(max(1, lsu_workers), lsu_queue_size, lsu_queue_policy)
+
+        self.high = RecvLane('high')
+        self.low = RecvLane('low')
+        self.lanes = {'high': self.high, 'low': self.low}
+        self.held = deque()         # LSUs of the low lane waiting for room in the LSU queue
+        self._pending = False       # a dispatch is posted to the reactor
+        self._stalled = False       # waiting for room in the LSU queue
+        self._reactor = Reactor()
+        self._retry = Timer(STALL_RETRY, self.dispatch, reactor=self._reactor)
+
+    def receive(self, data, timestamp):
+        """
+        Queue a packet in the lane of its priority, dispatch() handles it.
+        """
+        if peekOspfType(data) in HIGH_PRIO_TYPES:
+            self.high.put(data, timestamp)
+        else:
+            self.low.put(data, timestamp)
+
+    def dispatch(self):
+        """
+        Handle the queued packets, on the reactor thread. All Hellos and DDs
+        go first, then at most DISPATCH_BUDGET other packets; the rest wait
+        for the next loop iteration, after the socket has been read again.
+        While the LSU queue is full, LSUs are held back in order rather than
+        block, and the LSRs and LSAcks behind them go on being handled. The
+        held LSUs are tried again every STALL_RETRY.
+        """
+        self._pending = False
+        if self._stalled:
+            self._stalled = False
+            self._retry.stop()
+
+        while self.high.queue:
+            data, timestamp = self.high.queue.popleft()
+            self._handle(self.high, data, timestamp)
 
-        self.lsu_handler = ThreadPool(1)
+        while self.held and not self._lsu_full():
+            data, timestamp = self.held.popleft()
+            self._handle(self.low, data, timestamp)
+
+        budget = DISPATCH_BUDGET
+        while self.low.queue and budget:
+            data, timestamp = self.low.queue.popleft()
+            if peekOspfType(data) == 4 and (self.held or self._lsu_full()):
+                self._hold(data, timestamp)
+                continue
+            self._handle(self.low, data, timestamp)
+            budget -= 1
+
+        if self.held:
+            self._stalled = True
+            self._retry.start()
+        if self.low.queue and not self._pending:
+            self._pending = True
+            self._reactor.call_soon(self.dispatch)
+
+    def _handle(self, lane, data, timestamp):
+        try:
+            self.ospf_handler(data, timestamp)
+        except Exception, e:
+            LOG.error('[Receiver] Handling packet failed: %s.' % e)
+            LOG.debug(traceback.format_exc())
+        lane.latency.add(time.time() - timestamp)
+
+    def _hold(self, data, timestamp):
+        if len(self.held) >= LANE_SIZE:
+            #dropped as the LSU queue would drop it, counted there
+            self.held.popleft()
+            self.lsu_handler.count_dropped()
+        self.held.append((data, timestamp))
+
+    def _lsu_full(self):
+        """
+        Whether handling an LSU now would block on the full LSU queue.
+        """
+        return self.lsu_handler.policy != DROP_OLDEST and self.lsu_handler.full()
 
     def ospf_handler(self, data, timestamp):
         """
@@ -36,11 +157,18 @@ class OspfReceiver(object):
         LOG.debug('[Receiver] Received packet: %s:%f'
                   % (time.strftime('%H:%M', time.localtime(timestamp)), timestamp % 60))
 
-        pkt = OspfParser.parse(data, verbose=self.pkt_dis)
+        #LSRs skip the generic parser unless they have to be displayed.
+        if self.printer is None and peekOspfType(data) == 3:
+            return self._handle_lsr(data)
+
+        pkt = OspfParser.parse(data)
         if pkt is None:
             LOG.error('[Receiver] Wrong Packet.')
             return False
 
+        if self.printer is not None:
+            self.printer.put(pkt)
+
         self.ism.ai.oi.stat.total_received_packet_count += 1
 
         hdr = pkt['V']
@@ -78,16 +206,7 @@ class OspfReceiver(object):
                     LOG.debug('[Receiver] DD from %s not handled.' % util.int2ip(nrid))
 
         elif ospf_type == 3:
-            LOG.debug('[Receiver] Received a LSR from %s to %s.' % (util.int2ip(nrid), util.int2ip(dst)))
-            self.ism.ai.oi.stat.recv_lsr_count += 1
-            if util.int2ip(dst) == ALL_D_ROUTER:
-                LOG.warn('[Receiver] Not DR/BDR, drop it.')
-            else:
-                if nrid in self.nsm_list:
-                    self.nsm_list[nrid].ep.check_lsr(pkt)
-                    self.ism.ai.oi.stat.total_handled_packet_count += 1
-                else:
-                    LOG.debug('[Receiver] LSR from %s not handled.' % util.int2ip(nrid))
+            self._check_lsr(dst, nrid, aid, hdr['V']['LSRS'])
 
         elif ospf_type == 4:
             LOG.debug('[Receiver] Received a LSU from %s to %s.' % (util.int2ip(nrid), util.int2ip(dst)))
@@ -96,7 +215,8 @@ class OspfReceiver(object):
                 LOG.warn('[Receiver] Not DR/BDR, drop it.')
             else:
                 if nrid in self.nsm_list:
-                    self.lsu_handler.addTask(self._handle_lsu, (nrid, pkt))
+                    #a retransmitted LSU still queued is the same bytes from the same neighbor
+                    self.lsu_handler.addTask(self._handle_lsu, (nrid, pkt), key=(nrid, data), shard=nrid)
                     self.ism.ai.oi.stat.total_handled_packet_count += 1
                 else:
                     LOG.warn('[Receiver] LSU from %s not handled.' % util.int2ip(nrid))
@@ -117,5 +237,36 @@ class OspfReceiver(object):
             LOG.error('[Error] Wrong OSPF packet type.')
             pass
 
+    def _handle_lsr(self, data):
+        """
+        Fast path for LSR, the requests are taken as tuples straight from
+        the packet, without building the packet dicts.
+        """
+        lsr = OspfParser.parse_lsr(data)
+        if lsr is None:
+            LOG.error('[Receiver] Wrong Packet.')
+            return False
+
+        self.ism.ai.oi.stat.total_received_packet_count += 1
+        dst, nrid, aid, lsrs = lsr
+        self._check_lsr(dst, nrid, aid, lsrs)
+
+    def _check_lsr(self, dst, nrid, aid, lsrs):
+        LOG.debug('[Receiver] Received a LSR from %s to %s.' % (util.int2ip(nrid), util.int2ip(dst)))
+        self.ism.ai.oi.stat.recv_lsr_count += 1
+        self.ism.ai.oi.stat.recv_lsr_req_count += len(lsrs)
+        if util.int2ip(dst) == ALL_D_ROUTER:
+            LOG.warn('[Receiver] Not DR/BDR, drop it.')
+        else:
+            if nrid in self.nsm_list:
+                self.nsm_list[nrid].ep.check_lsr(lsrs, aid)
+                self.ism.ai.oi.stat.total_handled_packet_count += 1
+            else:
+                LOG.debug('[Receiver] LSR from %s not handled.' % util.int2ip(nrid))
+
     def _handle_lsu(self, nrid, pkt):
-        self.nsm_list[nrid].fp.check_lsu(pkt)
+        try:
+            self.nsm_list[nrid].fp.check_lsu(pkt)
+        finally:
+            #the LSAs installed from this LSU become visible to the API at once
+            self.ism.ai.oi.lsdb.publish()
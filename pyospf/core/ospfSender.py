@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+
+import time
+import logging
+import threading
+
+from pyospf.basic.ospfSock import OspfSock
+
+
+LOG = logging.getLogger(__name__)
+
+# Queued packets sent per syscall, a full batch is flushed at once.
+SEND_BATCH = 64
+
+
+class OspfSender(object):
+    """
+    Transmit side of an interface. All protocols of the interface send
+    through one raw socket with an explicit destination, instead of a
+    socket per protocol per neighbor connected before each send.
+
+    Packets given to queue() wait at most flush_latency seconds, so that
+    the LSR, LSU and LSAck bursts of a database exchange go out together
+    with sendmmsg. send() writes at once.
+    """
+
+    def __init__(self, ism):
+        self.ism = ism
+        self.flush_latency = ism.ai.oi.config['send_flush_latency'] / 1000.0
+
+        self._sock = OspfSock()
+        self._sock.bind(self.ism.ip_intf_addr)
+        #The raw socket gets a copy of every OSPF packet the host receives,
+        #never read here. Drop them in the kernel, or keep as few as possible.
+        if not self._sock.attach_drop_filter():
+            self._sock.set_recv_buffer(0)
+
+        self._queue = list()
+        self._oldest = 0        # time the first packet of the queue was queued
+        self._cond = threading.Condition()
+        self._flusher = None
+        self._closed = False
+
+    def send(self, pkt, dst):
+        """
+        Send an OSPF packet to dst, a dotted ip string. Counters per
+        destination are kept in the instance statistics.
+        """
+        ok = self._sock.sendto(pkt, dst)
+        self._count(pkt, dst, ok)
+        return ok
+
+    def queue(self, pkt, dst):
+        """
+        Queue an OSPF packet for dst, sent with the next flush.
+        """
+        if self.flush_latency <= 0:
+            return self.send(pkt, dst)
+        self._cond.acquire()
+        try:
+            if self._closed:
+                return False
+            if not self._queue:
+                self._oldest = time.time()
+            self._queue.append((pkt, dst))
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name='OspfSender')
+                self._flusher.setDaemon(True)
+                self._flusher.start()
+            if len(self._queue) == 1 or len(self._queue) >= SEND_BATCH:
+                self._cond.notify()
+        finally:
+            self._cond.release()
+        return True
+
+    def flush(self):
+        """
+        Send everything queued now, from the calling thread.
+        """
+        self._cond.acquire()
+        msgs, self._queue = self._queue, list()
+        self._cond.release()
+        self._send_batch(msgs)
+
+    def _run(self):
+        while True:
+            self._cond.acquire()
+            try:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                while len(self._queue) < SEND_BATCH and not self._closed:
+                    remaining = self._oldest + self.flush_latency - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                msgs, self._queue = self._queue, list()
+                closed = self._closed
+            finally:
+                self._cond.release()
+            self._send_batch(msgs)
+            if closed:
+                return
+
+    def _send_batch(self, msgs):
+        if not msgs:
+            return
+        for (pkt, dst), ok in zip(msgs, self._sock.sendto_batch(msgs, SEND_BATCH)):
+            self._count(pkt, dst, ok)
+
+    def _count(self, pkt, dst, ok):
+        self.ism.ai.oi.stat.count_send_dst(dst, len(pkt), ok)
+        if not ok:
+            LOG.error('[ERROR] Send packet to %s failed.' % dst)
+
+    def close(self):
+        self._cond.acquire()
+        self._closed = True
+        self._cond.notify()
+        self._cond.release()
+        if self._flusher is not None:
+            self._flusher.join(1)
+        self.flush()
+        self._sock.close()
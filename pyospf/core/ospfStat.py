@@ -3,6 +3,8 @@
 
 import logging
 
+from pyospf.basic.ospfParser import LSA_CACHE
+
 
 LOG = logging.getLogger(__name__)
 
@@ -25,14 +27,39 @@ class OspfStat(object):
         self.recv_hello_count = 0
         self.recv_dd_count = 0
         self.recv_lsr_count = 0
+        self.recv_lsr_req_count = 0
         self.recv_lsu_count = 0
         self.recv_lsack_count = 0
+        self.recv_drop_count = 0        # dropped by the kernel, socket buffer full
+        self.recv_trunc_count = 0
+        self.recv_buffer_size = 0
         self.total_send_packet_count = 0
         self.send_hello_count = 0
         self.send_dd_count = 0
         self.send_lsr_count = 0
         self.send_lsu_count = 0
         self.send_lsack_count = 0
+        self.send_dst_count = dict()    # {dst ip: {'pkt', 'byte', 'err'}}
+        self.lsu_queue = None
+        self.recv_lanes = dict()        # {lane name: RecvLane}
+
+    def count_send_dst(self, dst, length, ok=True):
+        count = self.send_dst_count.get(dst)
+        if count is None:
+            count = self.send_dst_count[dst] = {'pkt': 0, 'byte': 0, 'err': 0}
+        if ok:
+            count['pkt'] += 1
+            count['byte'] += length
+        else:
+            count['err'] += 1
+
+    @property
+    def lsa_cache_hit_count(self):
+        return LSA_CACHE.hits
+
+    @property
+    def lsa_cache_miss_count(self):
+        return LSA_CACHE.misses
 
     def get_stat_all(self):
         stat_all = {
@@ -43,15 +70,29 @@ class OspfStat(object):
                 'recv_hello': self.recv_hello_count,
                 'recv_dd': self.recv_dd_count,
                 'recv_lsr': self.recv_lsr_count,
+                'recv_lsr_req': self.recv_lsr_req_count,
                 'recv_lsu': self.recv_lsu_count,
                 'recv_lsack': self.recv_lsack_count,
             },
+            'recv_sock': {
+                'kernel_drop': self.recv_drop_count,
+                'truncated': self.recv_trunc_count,
+                'rcvbuf': self.recv_buffer_size,
+            },
             'detail_send': {
                 'send_hello': self.send_hello_count,
                 'send_dd': self.send_dd_count,
                 'send_lsr': self.send_lsr_count,
                 'send_lsu': self.send_lsu_count,
                 'send_lsack': self.send_lsack_count,
+            },
+            'send_dst': self.send_dst_count,
+            'lsu_queue': self.lsu_queue.get_stat() if self.lsu_queue is not None else {},
+            'recv_lanes': dict([(name, lane.get_stat()) for name, lane in self.recv_lanes.items()]),
+            'lsa_cache': {
+                'hit': self.lsa_cache_hit_count,
+                'miss': self.lsa_cache_miss_count,
+                'size': len(LSA_CACHE),
             }
         }
         return stat_all
\ No newline at end of file
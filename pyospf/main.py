@@ -40,6 +40,14 @@ def main(args=None):
     probe_cfg['mtu'] = CONF.probe.mtu
     probe_cfg['rxmt_interval'] = CONF.probe.rxmt_interval
     probe_cfg['packet_display'] = CONF.probe.packet_display
+    probe_cfg['lsa_cache_size'] = CONF.probe.lsa_cache_size
+    probe_cfg['send_flush_latency'] = CONF.probe.send_flush_latency
+    probe_cfg['lsu_queue_size'] = CONF.probe.lsu_queue_size
+    probe_cfg['lsu_queue_policy'] = CONF.probe.lsu_queue_policy
+    probe_cfg['lsu_workers'] = CONF.probe.lsu_workers
+    probe_cfg['lsdb_change_log'] = CONF.probe.lsdb_change_log
+    probe_cfg['recv_buffer'] = CONF.probe.recv_buffer
+    probe_cfg['recv_batch'] = CONF.probe.recv_batch
 
     api_cfg = dict()
     api_cfg['bind_host'] = CONF.api.bind_host
@@ -5,7 +5,6 @@
 from dpkt.ospf import OSPF
 
 from pyospf.basic.ospfPacket import *
-from pyospf.basic.ospfSock import OspfSock
 from pyospf.protocols.protocol import *
 from pyospf.utils.timer import Timer
 from pyospf.basic.constant import *
@@ -36,13 +35,6 @@ class ExchangeProtocol(OspfProtocol):
         #TODO: if link type is virtual or others, set dst specific.
             pass
 
-        #ospf socket
-        self._sock = OspfSock()
-        self._sock.bind(self.nsm.ism.ip_intf_addr)
-
-    def __del__(self):
-        self._sock.close()
-
     def set_dd_options(self):
         dolist = list(util.int2bin(self.nsm.dd_flags))
         self.init, self.more, self.ms = dolist[-3], dolist[-2], dolist[-1]
@@ -221,10 +213,9 @@ class ExchangeProtocol(OspfProtocol):
                 self.dst = util.int2ip(self.nsm.ism.drip)
             if self.nsm.ism.bdrip == self.nsm.src:
                 self.dst = util.int2ip(self.nsm.ism.bdrip)
-        self._sock.conn(self.dst)
 
         LOG.info('[Exchange] Send DD to %s.' % self.dst)
-        self._sock.sendp(pkt)
+        self.nsm.ism.sender.send(pkt, self.dst)
 
         self.nsm.ism.ai.oi.stat.send_dd_count += 1
         self.nsm.ism.ai.oi.stat.total_send_packet_count += 1
@@ -245,12 +236,8 @@ class ExchangeProtocol(OspfProtocol):
 
     def _get_lsa(self, pkt):
         aid = pkt['V']['AID']
-        lsa_hdr_list = pkt['V']['V']['LSAS']
-        for lsah in lsa_hdr_list.keys():
-            tp, lsid, adv, seq = lsa_hdr_list[lsah]['T'],\
-                                 lsa_hdr_list[lsah]['LSID'],\
-                                 lsa_hdr_list[lsah]['ADVRTR'],\
-                                 lsa_hdr_list[lsah]['LSSEQNO'],\
+        for lsah in pkt['V']['V']['LSAS']:
+            tp, lsid, adv, seq = lsah.type, lsah.lsid, lsah.advrtr, lsah.seqno
 
             #generate lsa key according to lsa type.
             if tp == 5:
@@ -336,15 +323,43 @@ class ExchangeProtocol(OspfProtocol):
             if self.nsm.ism.bdrip == self.nsm.src:
                 self.dst = util.int2ip(self.nsm.ism.bdrip)
         LOG.debug('[Exchange] Send LSR to %s.' % self.dst)
-        self._sock.conn(self.dst)
         for p in pkts:
-            self._sock.sendp(p)
+            self.nsm.ism.sender.queue(p, self.dst)
 
             self.nsm.ism.ai.oi.stat.send_lsr_count += 1
             self.nsm.ism.ai.oi.stat.total_send_packet_count += 1
 
-    def check_lsr(self, pkt):
+    def check_lsr(self, lsrs, aid):
         """
-        The probe doesn't need to receive LSR
+        Answer received LSR according to RFC chap. 10.7,
+        lsrs is a list of (type, lsid, advrtr) requests.
+        Requested LSAs are sent back in LSUs, a request for an LSA
+        not in the LSDB fires BadLSReq.
         """
-        pass
+        if self.nsm.state != NSM_STATE['NSM_Exchange'] and\
+           self.nsm.state != NSM_STATE['NSM_Loading'] and\
+           self.nsm.state != NSM_STATE['NSM_Full']:
+            LOG.warn('[Exchange] Ignore LSR for inappropriate state.')
+            return False
+
+        lsas = []
+        for tp, lsid, adv in lsrs:
+            if tp == 5:
+                lsakey = (tp, lsid, adv)
+            else:
+                lsakey = (tp, aid, lsid, adv)
+
+            lsalist = self.nsm.ism.ai.oi.lsdb.lookup_lsa_list(tp)
+            lsa = None
+            if not lsalist is None:
+                lsa = self.lookup_lsa(lsakey, lsalist)
+            if lsa is None:
+                LOG.warn('[Exchange] Requested LSA %s is not in LSDB.' % str(lsakey))
+                LOG.info('[NSM] Event: NSM_BadLSReq')
+                self.nsm.fire('NSM_BadLSReq')
+                return False
+            lsas.append(lsa)
+
+        if len(lsas) != 0:
+            self.nsm.fp.send_lsu(self.nsm.fp.gen_lsu(lsas))
+        return True
@@ -1,13 +1,12 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
-import datetime
 
 from dpkt.ospf import OSPF
 
 from pyospf.basic.constant import NSM_STATE
+from pyospf.core.ospfLsdb import LSA_ADD, LSA_REPLACE, LSA_FLUSH
 from pyospf.basic.ospfPacket import *
-from pyospf.basic.ospfSock import OspfSock
 from pyospf.protocols.protocol import *
 
 
@@ -18,13 +17,6 @@ class FloodProtocol(OspfProtocol):
         OspfProtocol.__init__(self)
         self.nsm = nsm
 
-        #ospf socket
-        self._sock = OspfSock()
-        self._sock.bind(self.nsm.ism.ip_intf_addr)
-
-    def __del__(self):
-        self._sock.close()
-
     def check_lsu(self, pkt):
         """
         Check LSU according to RFC chap. 13
@@ -87,43 +79,18 @@ class FloodProtocol(OspfProtocol):
                     #send lsack and continue to handle next lsa
                     LOG.info('[Flood] Received MAX age LSA %s. Send unicast LSAck.' % str(ls))
 
-                    self._sock.conn(util.int2ip(self.nsm.src))
                     lsahdr = {1: lsas[lsa]}
-                    self.send_lsack(self.gen_lsack(lsahdr))
+                    self.send_lsack(self.gen_lsack(lsahdr), util.int2ip(self.nsm.src))
                     continue
 
                 #step 5
-                exist_lsa = self.lookup_lsa(ls, lslist)
-
-                if exist_lsa is None or self.judge_new_lsa(exist_lsa['H'], lsas[lsa]['H']) == lsas[lsa]['H']:
-                    #check whether this lsa is added in lslist in MinLSArrival, if yes, drop it.
-                    if (exist_lsa is not None) and self.judge_new_lsa(exist_lsa['H'], lsas[lsa]['H']) == lsas[lsa]['H']:
-                        #step 5a
-                        exist_lsa_timestamp = util.strptime(datetimeLock, exist_lsa['TIMESTAMP'])
-                        if abs((exist_lsa_timestamp - datetime.datetime.now()).seconds) < MIN_LS_ARRIVAL:
-                            LOG.debug('[Flood] LSA received in MinLSArrival.')
-                            continue
-                        #TODO: flood this lsa to subset of the interfaces. step 5b
-                        else:
-                            pass
+                exist_lsa, installed = self.install_lsa(ls, lsas[lsa], lslist, aid)
 
-                    #remove this lsa in all neighbors' ls_rxmt. step 5c
-                    for rid in self.nsm.ism.hp.nsm_list:
-                        if self.nsm.ism.hp.nsm_list[rid].ls_rxmt.count(lsas[lsa]) > 0:
-                            self.nsm.ism.hp.nsm_list[rid].ls_rxmt.remove(lsas[lsa])
-
-                    #add timestamp and add this lsa to ls list. step 5d
-                    lsas[lsa]['TIMESTAMP'] = util.current_time_str()
-                    lsas[lsa]['AREA'] = aid
-                    self.nsm.ism.ai.oi.lsdb.lsdb_lock.acquire()
-                    if ls in lslist and age == MAXAGE:
-                        #if the age is MAXAGE, delete this lsa in the list. Attention: this is not the rule in rfc.
-                        LOG.info('[Flood] Received LSA %s of MAXAGE. Delete it in LSDB.' % str(ls))
-                        del lslist[ls]
-                    else:
-                        lslist[ls] = lsas[lsa]
-                    self.nsm.ism.ai.oi.lsdb.lsdb_lock.release()
+                if installed is None:
+                    LOG.debug('[Flood] LSA received in MinLSArrival.')
+                    continue
 
+                if installed:
                     #remove the lsa in ls_req if it exists in it. Attention: this is not the rule in rfc.
                     if ls in self.nsm.ls_req:
                         self.nsm.ls_req.remove(ls)
@@ -149,12 +116,15 @@ class FloodProtocol(OspfProtocol):
                         return
                     #if the existLSA is equal to this lsa, do as follow. step 7
                     if not self.judge_new_lsa(exist_lsa['H'], lsas[lsa]['H']):
-                        #step 7a
-                        if lsas[lsa] in self.nsm.ls_rxmt:
+                        #step 7a, ls_rxmt is also changed by the LSUs of other neighbors
+                        self.nsm.ism.ai.oi.lsdb.rxmt_lock.acquire()
+                        implied = lsas[lsa] in self.nsm.ls_rxmt
+                        if implied:
                             #implied acknowledgment
                             self.nsm.ls_rxmt.remove(lsas[lsa])
+                        self.nsm.ism.ai.oi.lsdb.rxmt_lock.release()
                         #need to send lsack to neighbor, step 7b
-                        else:
+                        if not implied:
                             uniack.append(lsas[lsa])
                         continue
 
@@ -176,8 +146,7 @@ class FloodProtocol(OspfProtocol):
                     uniacks = {}
                     for indexack in range(0, len(uniack)):
                         uniacks[indexack + 1] = uniack[indexack]
-                    self._sock.conn(util.int2ip(self.nsm.src))
-                    self.send_lsack(self.gen_lsack(uniacks))
+                    self.send_lsack(self.gen_lsack(uniacks), util.int2ip(self.nsm.src))
 
                 if len(lsas) != 0:
                     if self.nsm.ism.link_type == 'Broadcast':
@@ -187,17 +156,127 @@ class FloodProtocol(OspfProtocol):
                     else:
                         dst = ALL_SPF_ROUTER
                     LOG.debug('[Flood] Send multicast LSAck to %s.' % dst)
-                    self._sock.conn(dst)
-                    self.send_lsack(self.gen_lsack(lsas))
+                    self.send_lsack(self.gen_lsack(lsas), dst)
         else:
             LOG.warn('[Flood] NSM is under Exchange state, drop this LSU.')
             return
 
+    def install_lsa(self, ls, lsa, lslist, aid):
+        """
+        Steps 5 to 5d: install lsa if it is newer than the one in the LSDB.
+        Done under the lock of its type, as LSUs from different
+        neighbors are handled concurrently. Return the LSA found in the LSDB
+        and True if lsa was installed, None if it came within MinLSArrival,
+        else False.
+        """
+        lsdb = self.nsm.ism.ai.oi.lsdb
+        lsa_type = lsdb.convert_lsa_type_name(ls[0])
+        lock = lsdb.locks[lsa_type]
+        lock.acquire()
+        try:
+            exist_lsa = self.lookup_lsa(ls, lslist)
+            if exist_lsa is not None and self.judge_new_lsa(exist_lsa['H'], lsa['H']) != lsa['H']:
+                return exist_lsa, False
+
+            #check whether this lsa is added in lslist in MinLSArrival, if yes, drop it.
+            if exist_lsa is not None:
+                #step 5a
+                if util.monotonic() - exist_lsa['TIMESTAMP'] < MIN_LS_ARRIVAL:
+                    return exist_lsa, None
+                #TODO: flood this lsa to subset of the interfaces. step 5b
+
+            #remove this lsa in all neighbors' ls_rxmt. step 5c
+            lsdb.rxmt_lock.acquire()
+            for rid in self.nsm.ism.hp.nsm_list:
+                if self.nsm.ism.hp.nsm_list[rid].ls_rxmt.count(lsa) > 0:
+                    self.nsm.ism.hp.nsm_list[rid].ls_rxmt.remove(lsa)
+            lsdb.rxmt_lock.release()
+
+            #add timestamp and add this lsa to ls list. step 5d
+            lsa['TIMESTAMP'] = util.monotonic()
+            lsa['AREA'] = aid
+            if ls in lslist and lsa['H']['AGE'] == MAXAGE:
+                #if the age is MAXAGE, delete this lsa in the list. Attention: this is not the rule in rfc.
+                LOG.info('[Flood] Received LSA %s of MAXAGE. Delete it in LSDB.' % str(ls))
+                del lslist[ls]
+                lsdb.record(LSA_FLUSH, lsa_type, ls, lsa)
+            else:
+                op = LSA_REPLACE if ls in lslist else LSA_ADD
+                lslist[ls] = lsa
+                lsdb.aging[lsa_type].add(lslist, ls, lsa)
+                lsdb.record(op, lsa_type, ls, lsa)
+            return exist_lsa, True
+        finally:
+            lock.release()
+
     def check_lsack(self, pkt):
         pass
 
-    def send_lsack(self, pkt):
-        self._sock.sendp(pkt)
+    def send_lsu(self, pkts):
+        LOG.debug('[Flood] Send LSU to %s.' % util.int2ip(self.nsm.src))
+        dst = util.int2ip(self.nsm.src)
+        for p in pkts:
+            self.nsm.ism.sender.queue(p, dst)
+
+            self.nsm.ism.ai.oi.stat.send_lsu_count += 1
+            self.nsm.ism.ai.oi.stat.total_send_packet_count += 1
+
+    def gen_lsu(self, lsas):
+        """
+        Pack LSDB LSAs into LSUs fitting the interface MTU. The age is
+        advanced by the time spent in the LSDB and InfTransDelay.
+        """
+        pkts = []
+        room = self.nsm.ism.mtu - 20 - len(OSPF()) - len(LSU())     # 20 for ip header
+        lsudata, size = [], 0
+
+        for lsa in lsas:
+            raw = getattr(lsa, 'raw', None)
+            if raw is None:
+                LOG.warn('[Flood] LSA %s has no raw body, not sent.' % str(self.generate_lsa_key(lsa)[0]))
+                continue
+            hdr = lsa['H']
+            age = hdr['AGE']
+            if hdr['DNA'] == 0:
+                age += int(util.monotonic() - lsa['TIMESTAMP']) + self.nsm.ism.inf_trans_delay
+                age = min(age, MAXAGE)
+            else:
+                age |= 0x8000
+            data = str(LSAHeader(
+                age=age,
+                options=self.convert_options_to_int(hdr['OPTS']),
+                type=hdr['T'],
+                id=hdr['LSID'],
+                adv=hdr['ADVRTR'],
+                seq=hdr['LSSEQNO'],
+                sum=hdr['CKSUM'],
+                len=hdr['L']
+            )) + raw
+
+            if len(lsudata) != 0 and size + len(data) > room:
+                pkts.append(self._gen_lsu_packet(lsudata))
+                lsudata, size = [], 0
+            lsudata.append(data)
+            size += len(data)
+
+        if len(lsudata) != 0:
+            pkts.append(self._gen_lsu_packet(lsudata))
+        return pkts
+
+    def _gen_lsu_packet(self, lsudata):
+        ospfdata = str(LSU(lsanum=len(lsudata))) + ''.join(lsudata)
+        ospf_packet = OSPF(
+            v=self.version,
+            type=4,             # 4 for lsu
+            area=self.area,
+            len=len(ospfdata)+len(OSPF()),
+            router=self.rid,
+            data=ospfdata
+        )
+        return str(ospf_packet)
+
+    def send_lsack(self, pkt, dst):
+        self.nsm.ism.sender.queue(pkt, dst)
 
         self.nsm.ism.ai.oi.stat.send_lsack_count += 1
         self.nsm.ism.ai.oi.stat.total_send_packet_count += 1
@@ -5,7 +5,6 @@ from dpkt.ospf import OSPF
 
 from pyospf.core.neighborStateMachine import NSM
 from pyospf.basic.ospfPacket import *
-from pyospf.basic.ospfSock import OspfSock
 from pyospf.basic.constant import *
 from pyospf.protocols.protocol import *
 from pyospf.utils import util
@@ -25,14 +24,6 @@ class HelloProtocol(OspfProtocol):
         self.ism = ism
         self.nsm_list = ism.nbr_list
 
-        #ospf socket
-        self._sock = OspfSock()
-        self._sock.bind(self.ism.ip_intf_addr)
-        self._sock.conn(ALL_SPF_ROUTER)
-
-    def __del__(self):
-        self._sock.close()
-
     def set_conf(self, v, hi, di, r, a, m, o, t, dr, bdr):
         self.version = v
         self.hello_interval = hi
@@ -47,7 +38,7 @@ class HelloProtocol(OspfProtocol):
 
     def send_hello(self, pkt):
         LOG.debug('[Hello] Send Hello.')
-        self._sock.sendp(pkt)
+        self.ism.sender.send(pkt, ALL_SPF_ROUTER)
         self.ism.ai.oi.stat.send_hello_count += 1
         self.ism.ai.oi.stat.total_send_packet_count += 1
 
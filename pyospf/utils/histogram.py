@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import bisect
+
+
+#Upper bounds of the buckets in milliseconds, the last bucket is unbounded.
+LATENCY_BOUNDS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class LatencyHistogram(object):
+    """
+    Counts latencies in fixed buckets, cheap enough to be updated for
+    every packet. Percentiles are estimated as the upper bound of the
+    bucket they fall in.
+    """
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        self.buckets[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        """
+        Upper bound in milliseconds of the bucket holding the p-th
+        percentile, the max for the unbounded bucket.
+        """
+        if not self.count:
+            return 0
+        rank = self.count * p / 100.0
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def get_stat(self):
+        buckets = dict()
+        for i, n in enumerate(self.buckets):
+            if n:
+                name = '<=%gms' % self.bounds[i] if i < len(self.bounds) else '>%gms' % self.bounds[-1]
+                buckets[name] = n
+        return {
+            'count': self.count,
+            'avg_ms': self.total / self.count if self.count else 0,
+            'max_ms': self.max,
+            'p50_ms': self.percentile(50),
+            'p99_ms': self.percentile(99),
+            'buckets': buckets,
+        }
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+recvmmsg(2) and sendmmsg(2) through ctypes, to read or write many datagrams
+with one syscall. Only available on Linux, HAVE_RECVMMSG and HAVE_SENDMMSG
+tell whether they can be used.
+"""
+
+import os
+import ctypes
+import ctypes.util
+import socket
+import struct
+import time
+
+
+MSG_TRUNC = 0x20
+MSG_WAITFORONE = 0x10000
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p),
+                ('iov_len', ctypes.c_size_t)]
+
+
+class sockaddr_in(ctypes.Structure):
+    _fields_ = [('sin_family', ctypes.c_ushort),
+                ('sin_port', ctypes.c_ushort),
+                ('sin_addr', ctypes.c_ubyte * 4),
+                ('sin_zero', ctypes.c_ubyte * 8)]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p),
+                ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(iovec)),
+                ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p),
+                ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', msghdr),
+                ('msg_len', ctypes.c_uint)]
+
+
+_FLAGS_OFF = msghdr.msg_flags.offset
+_SOCKADDR_LEN = ctypes.sizeof(sockaddr_in)
+_MMSGHDR_LEN = ctypes.sizeof(mmsghdr)
+_ADDR_OFF = sockaddr_in.sin_addr.offset
+_IOVEC_LEN = ctypes.sizeof(iovec)
+
+# msg_controllen, msg_flags and msg_len of one mmsghdr, and the address of
+# one sockaddr_in, with the bytes around them skipped.
+_CTRLLEN_OFF = msghdr.msg_controllen.offset
+_SIZE_T_LEN = ctypes.sizeof(ctypes.c_size_t)
+_MSG_FMT = '%dx%s%dxi%dxI%dx' % (_CTRLLEN_OFF, 'Q' if _SIZE_T_LEN == 8 else 'I',
+                                 _FLAGS_OFF - _CTRLLEN_OFF - _SIZE_T_LEN,
+                                mmsghdr.msg_len.offset - _FLAGS_OFF - 4,
+                                _MMSGHDR_LEN - mmsghdr.msg_len.offset - 4)
+_ADDR_FMT = '%dx4s%dx' % (_ADDR_OFF, _SOCKADDR_LEN - _ADDR_OFF - 4)
+
+# Ancillary data asked for with SO_TIMESTAMPNS and SO_RXQ_OVFL, see
+# socket(7). Python 2 does not export them, the fallbacks are the values
+# of x86 and ARM. A cmsghdr and its data are aligned to a long, CMSG_ALIGN.
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+SO_RXQ_OVFL = getattr(socket, 'SO_RXQ_OVFL', 40)
+CONTROL_LEN = 64        # room for both cmsgs
+_CMSG_ALIGN = ctypes.sizeof(ctypes.c_long)
+_CMSG_HDR_ST = struct.Struct('@Lii')
+_CMSG_DATA_OFF = (_CMSG_HDR_ST.size + _CMSG_ALIGN - 1) & ~(_CMSG_ALIGN - 1)
+_TIMESPEC_ST = struct.Struct('@ll')
+_DROPS_ST = struct.Struct('@I')
+
+
+def parse_control(ctrl, off, length):
+    """
+    Return (timestamp, drops) from the ancillary data ctrl[off:off+length],
+    either of them None when absent. The timestamp is in seconds like
+    time.time(), drops is the count of datagrams the kernel dropped on the
+    socket so far.
+    """
+    ts = drops = None
+    end = off + length
+    while off + _CMSG_DATA_OFF <= end:
+        (clen, level, ctype) = _CMSG_HDR_ST.unpack_from(ctrl, off)
+        if clen < _CMSG_DATA_OFF:
+            break
+        if level == socket.SOL_SOCKET:
+            if ctype == SO_TIMESTAMPNS:
+                (sec, nsec) = _TIMESPEC_ST.unpack_from(ctrl, off + _CMSG_DATA_OFF)
+                ts = sec + nsec * 1e-9
+            elif ctype == SO_RXQ_OVFL:
+                drops = _DROPS_ST.unpack_from(ctrl, off + _CMSG_DATA_OFF)[0]
+        off += (clen + _CMSG_ALIGN - 1) & ~(_CMSG_ALIGN - 1)
+    return ts, drops
+
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    _recvmmsg = _libc.recvmmsg
+    _recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint,
+                          ctypes.c_int, ctypes.c_void_p]
+    _recvmmsg.restype = ctypes.c_int
+    HAVE_RECVMMSG = True
+except (OSError, AttributeError, TypeError):
+    _recvmmsg = None
+    HAVE_RECVMMSG = False
+
+try:
+    _sendmmsg = _libc.sendmmsg
+    _sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+    _sendmmsg.restype = ctypes.c_int
+    HAVE_SENDMMSG = True
+except (NameError, AttributeError, TypeError):
+    _sendmmsg = None
+    HAVE_SENDMMSG = False
+
+
+class RecvBatch(object):
+    """
+    A pool of count receive buffers of bufsize bytes with their mmsghdr
+    array and room for ancillary data, allocated once and reused by every
+    recv call.
+    """
+
+    def __init__(self, count, bufsize):
+        self.count = count
+        self.bufsize = bufsize
+        self.truncated = 0
+        self.dropped = 0
+        #One contiguous pool, datagram i is read into pool[i * bufsize:].
+        self._pool = bytearray(count * bufsize)
+        self._view = memoryview(self._pool)
+        #Structs unpacking the headers and addresses of n datagrams at once, by n.
+        self._msgs_st = [struct.Struct('=' + _MSG_FMT * k) for k in xrange(count + 1)]
+        self._addrs_st = [struct.Struct('=' + _ADDR_FMT * k) for k in xrange(count + 1)]
+        self._ips = {}
+        base = ctypes.addressof((ctypes.c_char * len(self._pool)).from_buffer(self._pool))
+        self._iovs = (iovec * count)()
+        self._addrs = (sockaddr_in * count)()
+        self._ctrls = (ctypes.c_char * (count * CONTROL_LEN))()
+        self._msgs = (mmsghdr * count)()
+        for i in xrange(count):
+            self._iovs[i].iov_base = base + i * bufsize
+            self._iovs[i].iov_len = bufsize
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._iovs[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_name = ctypes.cast(ctypes.pointer(self._addrs[i]), ctypes.c_void_p)
+            hdr.msg_namelen = _SOCKADDR_LEN
+            hdr.msg_control = ctypes.addressof(self._ctrls) + i * CONTROL_LEN
+            hdr.msg_controllen = CONTROL_LEN
+        #The kernel writes msg_controllen back, it is restored from this copy.
+        self._msgs_init = ctypes.string_at(self._msgs, ctypes.sizeof(self._msgs))
+
+    def recv(self, fd):
+        """
+        Block until at least one datagram is queued on fd, then return up to
+        count of them as [(data, (src_ip, 0), timestamp)]. Each datagram is
+        copied out at its exact size, truncated datagrams are dropped. The
+        timestamp is the kernel receive time when SO_TIMESTAMPNS is on, else
+        the time recv returned.
+        """
+        n = _recvmmsg(fd, self._msgs, self.count, MSG_WAITFORONE, None)
+        if n < 0:
+            err = ctypes.get_errno()
+            raise socket.error(err, os.strerror(err))
+        now = time.time()
+
+        #Read the headers and addresses back with one call each, not field by field.
+        fl = self._msgs_st[n].unpack(ctypes.string_at(self._msgs, n * _MMSGHDR_LEN))
+        addrs = self._addrs_st[n].unpack(ctypes.string_at(self._addrs, n * _SOCKADDR_LEN))
+        ctrls = None
+        view, bufsize, ips = self._view, self.bufsize, self._ips
+        rv = []
+        for i in xrange(n):
+            ts = now
+            ctrllen = fl[3*i]
+            if ctrllen:
+                if ctrls is None:
+                    ctrls = ctypes.string_at(self._ctrls, n * CONTROL_LEN)
+                (kts, drops) = parse_control(ctrls, i * CONTROL_LEN, ctrllen)
+                if kts is not None:
+                    ts = kts
+                if drops is not None and drops > self.dropped:
+                    self.dropped = drops
+            if fl[3*i+1] & MSG_TRUNC:
+                self.truncated += 1
+                continue
+            addr = addrs[i]
+            ip = ips.get(addr)
+            if ip is None:
+                ip = ips[addr] = (socket.inet_ntoa(addr), 0)
+            off = i * bufsize
+            rv.append((view[off:off+fl[3*i+2]].tobytes(), ip, ts))
+        ctypes.memmove(self._msgs, self._msgs_init, n * _MMSGHDR_LEN)
+        return rv
+
+
+class SendBatch(object):
+    """
+    An mmsghdr array for up to count datagrams, allocated once. The iovecs
+    point straight into the str of every datagram through a c_char_p kept
+    for the call, nothing is copied.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self._sockaddrs = {}
+        self._iovs = (iovec * count)()
+        self._addrs = (sockaddr_in * count)()
+        self._msgs = (mmsghdr * count)()
+        for i in xrange(count):
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._iovs[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_name = ctypes.cast(ctypes.pointer(self._addrs[i]), ctypes.c_void_p)
+            hdr.msg_namelen = _SOCKADDR_LEN
+        #Structs packing the iovecs of n datagrams at once, by n.
+        self._iovs_st = [struct.Struct('@' + 'PL' * k) for k in xrange(count + 1)]
+
+    def _sockaddr(self, ip):
+        sa = self._sockaddrs.get(ip)
+        if sa is None:
+            sa = sockaddr_in(socket.AF_INET, 0)
+            ctypes.memmove(ctypes.addressof(sa) + _ADDR_OFF, socket.inet_aton(ip), 4)
+            sa = self._sockaddrs[ip] = ctypes.string_at(ctypes.addressof(sa), _SOCKADDR_LEN)
+        return sa
+
+    def send(self, fd, msgs):
+        """
+        Send up to count [(data, ip)] datagrams on fd in one syscall, data
+        being str. Return how many were sent, which may be fewer than given.
+        Raise socket.error when not even the first could be sent.
+        """
+        msgs = msgs[:self.count]
+        sockaddrs = self._sockaddrs
+        iovs, addrs, bufs = [], [], []
+        for data, ip in msgs:
+            if not isinstance(data, str):
+                raise TypeError('datagram must be str, not %s' % type(data).__name__)
+            sa = sockaddrs.get(ip)
+            if sa is None:
+                try:
+                    sa = self._sockaddr(ip)
+                except socket.error:
+                    #send what precedes a bad address, it fails on its own next time
+                    if not addrs:
+                        raise
+                    break
+            buf = ctypes.c_char_p(data)
+            bufs.append(buf)        # the address stays valid while buf lives
+            iovs.append(ctypes.c_void_p.from_buffer(buf).value)
+            iovs.append(len(data))
+            addrs.append(sa)
+        n = len(addrs)
+
+        #Write the iovecs and addresses with one copy each, not field by field.
+        ctypes.memmove(self._iovs, self._iovs_st[n].pack(*iovs), n * _IOVEC_LEN)
+        ctypes.memmove(self._addrs, ''.join(addrs), n * _SOCKADDR_LEN)
+        sent = _sendmmsg(fd, self._msgs, n, 0)
+        del bufs
+        if sent < 0:
+            err = ctypes.get_errno()
+            raise socket.error(err, os.strerror(err))
+        return sent
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Single-threaded event loop multiplexing file descriptors, timers and a
+queue of calls posted from other threads. Timers of pyospf.utils.timer run
+on it, so the ISM/NSM timers cost a timer store entry rather than a thread.
+"""
+
+import os
+import heapq
+import errno
+import select
+import logging
+import threading
+import traceback
+
+from pyospf.utils.util import monotonic
+from pyospf.utils.wheel import TimingWheel
+
+
+LOG = logging.getLogger(__name__)
+
+#TimerHeap is rebuilt when cancelled entries outnumber live ones by this.
+COMPACT_RATIO = 2
+
+
+class TimerHeap(object):
+    """
+    Timer store keeping deadlines in a heap, O(log n) to arm a timer.
+    Reset and cancelled entries stay in the heap until popped, and the heap
+    is rebuilt when they pile up. Not thread safe, the reactor locks it.
+    """
+
+    def __init__(self):
+        self._heap = list()         # [(deadline, seq, timer)]
+        self._seq = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, timer, deadline):
+        if timer._entry is None:
+            self.count += 1
+        self._seq += 1
+        entry = (deadline, self._seq, timer)
+        timer._entry = entry
+        heapq.heappush(self._heap, entry)
+        if len(self._heap) > COMPACT_RATIO * self.count + 64:
+            self._heap = [e for e in self._heap if e[2]._entry is e]
+            heapq.heapify(self._heap)
+
+    def cancel(self, timer):
+        if timer._entry is not None:
+            timer._entry = None
+            self.count -= 1
+
+    def expire(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            timer = entry[2]
+            if timer._entry is entry:
+                timer._entry = None
+                self.count -= 1
+                due.append(timer)
+        return due
+
+    def next_deadline(self):
+        while self._heap and self._heap[0][2]._entry is not self._heap[0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return self._heap[0][0]
+
+
+class Reactor(object):
+    """
+    The event loop, one per process. run() blocks the calling thread and
+    dispatches readable descriptors, due timers and posted calls on it.
+    Everything except run() may be called from any thread.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(Reactor, cls).__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def __init__(self, timers=None):
+        if hasattr(self, '_timers'):
+            return
+        self._timers = timers or TimingWheel()
+        self._calls = list()
+        self._readers = dict()      # {fd: callback}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+        #A byte on the pipe wakes the loop up when called from other threads.
+        self._wake_r, self._wake_w = os.pipe()
+        self._woken = False
+
+        if hasattr(select, 'epoll'):
+            self._epoll = select.epoll()
+            self._epoll.register(self._wake_r, select.EPOLLIN)
+        else:
+            self._epoll = None
+
+    def add_reader(self, fd, callback):
+        """
+        Call callback() on the loop whenever fd is readable.
+        """
+        self._readers[fd] = callback
+        if self._epoll is not None:
+            self._epoll.register(fd, select.EPOLLIN)
+        self._wake()
+
+    def remove_reader(self, fd):
+        if self._readers.pop(fd, None) is not None and self._epoll is not None:
+            self._epoll.unregister(fd)
+
+    def call_soon(self, callback, *args):
+        """
+        Run callback(*args) on the loop thread at its next iteration.
+        """
+        self._lock.acquire()
+        self._calls.append((callback, args))
+        self._lock.release()
+        self._wake()
+
+    def schedule(self, timer, deadline):
+        """
+        Fire timer._expire() at deadline, a util.monotonic() time, replacing
+        a pending deadline of the same timer. Used by Timer.
+        """
+        self._lock.acquire()
+        try:
+            nxt = self._timers.next_deadline()
+            self._timers.add(timer, deadline)
+        finally:
+            self._lock.release()
+        if nxt is None or deadline < nxt:
+            self._wake()
+
+    def cancel(self, timer):
+        self._lock.acquire()
+        self._timers.cancel(timer)
+        self._lock.release()
+
+    def _wake(self):
+        if self._thread is threading.current_thread() or self._woken:
+            return
+        self._woken = True
+        try:
+            os.write(self._wake_w, 'x')
+        except OSError:
+            pass
+
+    def _drain_wake(self):
+        try:
+            os.read(self._wake_r, 4096)
+        except OSError:
+            pass
+        self._woken = False
+
+    def _timeout(self):
+        """
+        Seconds until the next timer, None when there is none.
+        """
+        self._lock.acquire()
+        try:
+            if self._calls:
+                return 0
+            deadline = self._timers.next_deadline()
+            if deadline is None:
+                return None
+            return max(0, deadline - monotonic())
+        finally:
+            self._lock.release()
+
+    def _poll(self, timeout):
+        """
+        Return the readable descriptors, waiting at most timeout seconds.
+        """
+        try:
+            if self._epoll is not None:
+                return [fd for (fd, ev) in self._epoll.poll(-1 if timeout is None else timeout)]
+            fds = [self._wake_r] + self._readers.keys()
+            return select.select(fds, [], [], timeout)[0]
+        except (IOError, OSError, select.error), e:
+            if e.args[0] == errno.EINTR:
+                return []
+            raise
+
+    def _run_due(self):
+        self._lock.acquire()
+        try:
+            due = self._timers.expire(monotonic())
+        finally:
+            self._lock.release()
+        for timer in due:
+            self._call(timer._expire)
+
+    def _run_calls(self):
+        self._lock.acquire()
+        calls, self._calls = self._calls, list()
+        self._lock.release()
+        for callback, args in calls:
+            self._call(callback, *args)
+
+    def _call(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception, e:
+            LOG.error('[Reactor] %s failed: %s.' % (getattr(callback, '__name__', callback), e))
+            LOG.debug(traceback.format_exc())
+
+    def run(self):
+        """
+        Run the loop on the calling thread until stop().
+        """
+        self._thread = threading.current_thread()
+        self._running = True
+        LOG.debug('[Reactor] Start.')
+        while self._running:
+            for fd in self._poll(self._timeout()):
+                if fd == self._wake_r:
+                    self._drain_wake()
+                    continue
+                callback = self._readers.get(fd)
+                if callback is not None:
+                    self._call(callback)
+            self._run_due()
+            self._run_calls()
+        self._thread = None
+
+    def stop(self):
+        self._running = False
+        self._wake()
@@ -2,9 +2,13 @@
 # -*- coding:utf-8 -*-
 
 
+import time
+import errno
 import socket
 import traceback
 
+from pyospf.utils.mmsg import RecvBatch, SendBatch, HAVE_RECVMMSG, HAVE_SENDMMSG
+
 
 class Sock(object):
 
@@ -13,6 +17,9 @@ class Sock(object):
         self.type = stype
         self.proto = proto
         self.buf = bufsize
+        self._pool = None
+        self._pool_count = 0
+        self._send_pool = None
         self._create()
 
     def _create(self):
@@ -48,9 +55,87 @@ class Sock(object):
                 self._create()
             return False
 
+    def sendto(self, pack, ip, port=0):
+        try:
+            self.sock.sendto(pack, (ip, port))
+            return True
+        except Exception:
+            return False
+
+    def sendto_batch(self, msgs, count=64):
+        """
+        Send a list of (data, ip) with as few syscalls as possible, up to
+        count per sendmmsg where available, else one sendto each. Return a
+        list telling for every datagram whether it was sent. Other data than
+        str is sent with sendto.
+        """
+        if not HAVE_SENDMMSG or [m for m in msgs if not isinstance(m[0], str)]:
+            return [self.sendto(data, ip) for (data, ip) in msgs]
+        if self._send_pool is None or self._send_pool.count != count:
+            self._send_pool = SendBatch(count)
+        rv = []
+        fd = self.sock.fileno()
+        while len(rv) < len(msgs):
+            try:
+                rv.extend([True] * self._send_pool.send(fd, msgs[len(rv):]))
+            except socket.error, e:
+                if e.args[0] != errno.EINTR:
+                    #skip the datagram which failed, and go on with the rest
+                    rv.append(False)
+        return rv
+
     def recv(self):
         return self.sock.recvfrom(self.buf)
 
+    def recv_batch(self, count, bufsize=65535):
+        """
+        Receive up to count datagrams with as few syscalls as possible, block
+        until at least one arrives. Return a list of (data, address, timestamp).
+        Uses recvmmsg where available, else recvfrom_into non-blocking loops,
+        both into a pool of count buffers reused across calls. Only recvmmsg
+        gives kernel timestamps and drop counts, see OspfSock.enable_rx_info.
+        """
+        if self._pool is None or self._pool_count != count:
+            self._pool_count = count
+            if HAVE_RECVMMSG:
+                self._pool = RecvBatch(count, bufsize)
+            else:
+                self._pool = [bytearray(bufsize) for _ in xrange(count)]
+        try:
+            if HAVE_RECVMMSG:
+                return self._pool.recv(self.sock.fileno())
+            return self._recv_into_batch()
+        except socket.error, e:
+            if e.args[0] == errno.EINTR:
+                return []
+            raise
+
+    def _recv_into_batch(self):
+        rv = []
+        flags = 0
+        for buf in self._pool:
+            try:
+                n, addr = self.sock.recvfrom_into(buf, 0, flags)
+            except socket.error, e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK) and rv:
+                    break
+                raise
+            rv.append((str(buf[:n]), addr, time.time()))
+            flags = socket.MSG_DONTWAIT
+        return rv
+
+    @property
+    def rx_dropped(self):
+        """
+        Datagrams the kernel dropped on this socket, as last reported with
+        SO_RXQ_OVFL, 0 when unknown.
+        """
+        return getattr(self._pool, 'dropped', 0)
+
+    @property
+    def rx_truncated(self):
+        return getattr(self._pool, 'truncated', 0)
+
     def shutdown(self):
         self.sock.shutdown(socket.SHUT_RDWR)
 
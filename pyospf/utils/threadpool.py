@@ -2,7 +2,21 @@
 # -*- coding:utf-8 -*-
 
 
+import time
+import logging
 import threading
+import traceback
+
+from collections import deque
+
+
+LOG = logging.getLogger(__name__)
+
+#What addTask does when the queue is full.
+BLOCK = 'block'                 # wait for room, pushing back on the caller
+DROP_OLDEST = 'drop-oldest'     # drop the task at the head of the queue
+COALESCE = 'coalesce'           # as block, and drop tasks whose key is already queued
+POLICIES = (BLOCK, DROP_OLDEST, COALESCE)
 
 
 class WorkerTask(object):
@@ -10,81 +24,275 @@ class WorkerTask(object):
     A task to be performed by the ThreadPool.
     """
 
-    def __init__(self, function, args=(), kwargs={}):
+    __slots__ = ('function', 'args', 'kwargs', 'key', 'shard', 'queued')
+
+    def __init__(self, function, args=(), kwargs={}, key=None, shard=None):
         self.function = function
         self.args = args
         self.kwargs = kwargs
+        self.key = key
+        self.shard = shard
+        self.queued = time.time()
 
     def __call__(self):
         self.function(*self.args, **self.kwargs)
 
 
-class WorkerThread(threading.Thread):
+class ThreadPool(object):
     """
-    A thread managed by a thread pool.
+    Executes queued tasks in the background, on up to max_pool_size
+    threads. The queue holds at most max_queue tasks (0 for no bound),
+    beyond that the policy applies.
     """
 
-    def __init__(self, pool):
-        threading.Thread.__init__(self)
-        self.setDaemon(True)
-        self.pool = pool
-        self.busy = False
-        self._started = False
-        self._event = None
-
-    def work(self):
-        if self._started is True:
-            if self._event is not None and not self._event.isSet():
-                self._event.set()
-        else:
-            self._started = True
-            self.start()
+    def __init__(self, max_pool_size=10, max_queue=0, policy=BLOCK):
+        if policy not in POLICIES:
+            raise ValueError('unknown queue policy %s' % policy)
+        self.max_pool_size = max_pool_size
+        self.max_queue = max_queue
+        self.policy = policy
+        self._threads = []
+        self._tasks = deque()
+        self._keys = dict()         # {key: queued tasks with it}
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._idle = 0
+        self._shutdown = False
 
-    def run(self):
-        while True:
-            self.busy = True
-            while len(self.pool._tasks) > 0:
-                try:
-                    task = self.pool._tasks.pop(0)
-                    task()
-                except IndexError:
-                # Just in case another thread grabbed the task 1st.
-                    pass
-
-            # Sleep until needed again
-            self.busy = False
-            if self._event is None:
-                self._event = threading.Event()
+        #metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def addTask(self, function, args=(), kwargs={}, key=None, shard=None):
+        """
+        Queue function(*args, **kwargs). Return False when the task was not
+        queued: with the coalesce policy, another task with the same key is
+        still waiting, or the pool is shut down. shard is only used by the
+        ShardedThreadPool.
+        """
+        if self.policy != COALESCE:
+            key = None
+        task = WorkerTask(function, args, kwargs, key, shard)
+        self._lock.acquire()
+        try:
+            if self._shutdown:
+                return False
+            if key is not None and key in self._keys:
+                self.coalesced += 1
+                return False
+            if self.max_queue and self.qsize() >= self.max_queue:
+                if self.policy == DROP_OLDEST:
+                    self._forget(self._drop())
+                    self.dropped += 1
+                else:
+                    self.blocked += 1
+                    while self.qsize() >= self.max_queue and not self._shutdown:
+                        self._not_full.wait()
+                    if self._shutdown:
+                        return False
+            self._push(task)
+            if key is not None:
+                self._keys[key] = self._keys.get(key, 0) + 1
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.qsize())
+            if not self._idle and len(self._threads) < self.max_pool_size:
+                self._start_worker()
+            self._not_empty.notify()
+        finally:
+            self._lock.release()
+        return True
+
+    def _start_worker(self):
+        thread = threading.Thread(target=self._work, name='ThreadPool-%d' % len(self._threads))
+        thread.setDaemon(True)
+        self._threads.append(thread)
+        thread.start()
+
+    #The queue itself, called with the lock held. _ready() tells whether a
+    #task can be taken by _pop(), _release() is called once it has run.
+
+    def _push(self, task):
+        self._tasks.append(task)
+
+    def _pop(self):
+        return self._tasks.popleft()
+
+    def _drop(self):
+        return self._tasks.popleft()
+
+    def _ready(self):
+        return len(self._tasks)
+
+    def _release(self, task):
+        pass
+
+    def _forget(self, task):
+        if task.key is not None:
+            count = self._keys[task.key] - 1
+            if count:
+                self._keys[task.key] = count
             else:
-                self._event.clear()
-            self._event.wait()
+                del self._keys[task.key]
 
+    def _work(self):
+        while True:
+            self._lock.acquire()
+            try:
+                while not self._ready() and not (self._shutdown and not self.qsize()):
+                    self._idle += 1
+                    self._not_empty.wait()
+                    self._idle -= 1
+                if not self._ready():
+                    return
+                task = self._pop()
+                self._forget(task)
+                waited = time.time() - task.queued
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                self._not_full.notify()
+            finally:
+                self._lock.release()
 
-class ThreadPool(object):
+            ok = False
+            try:
+                task()
+                ok = True
+            except Exception, e:
+                LOG.error('[ThreadPool] Task %s failed: %s.' % (getattr(task.function, '__name__', task.function), e))
+                LOG.debug(traceback.format_exc())
+
+            #the metrics are updated by all workers, under the lock like the queue
+            self._lock.acquire()
+            try:
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._release(task)
+            finally:
+                self._lock.release()
+
+    def qsize(self):
+        return len(self._tasks)
+
+    def full(self):
+        return bool(self.max_queue) and self.qsize() >= self.max_queue
+
+    def count_dropped(self, n=1):
+        """
+        Count n tasks the caller dropped rather than queue them, holding them
+        back while the queue was full.
+        """
+        self._lock.acquire()
+        self.submitted += n
+        self.dropped += n
+        self._lock.release()
+
+    def get_stat(self):
+        depth = self.qsize()
+        taken = self.submitted - depth - self.dropped
+        return {
+            'depth': depth,
+            'max_depth': self.max_depth,
+            'limit': self.max_queue,
+            'policy': self.policy,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'blocked': self.blocked,
+            'wait_avg_ms': self.wait_total / taken * 1000 if taken > 0 else 0,
+            'wait_max_ms': self.wait_max * 1000,
+        }
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        Refuse new tasks and stop the workers once the queue is drained.
+        With wait, join them for at most timeout seconds in all.
+        """
+        self._lock.acquire()
+        self._shutdown = True
+        self._not_empty.notify_all()
+        self._not_full.notify_all()
+        self._lock.release()
+        if wait:
+            deadline = None if timeout is None else time.time() + timeout
+            for thread in self._threads:
+                thread.join(None if deadline is None else max(0, deadline - time.time()))
+        return not [t for t in self._threads if t.isAlive()]
+
+
+class ShardedThreadPool(ThreadPool):
     """
-    Executes queued tasks in the background.
+    A ThreadPool keeping one ordered queue per shard. Tasks of a shard run
+    one at a time in the order they were added, tasks of different shards
+    run concurrently. A worker takes one task of the shard at the head of
+    the ready queue, which goes back to its tail afterwards if it still has
+    tasks, so a busy shard does not hold up the others. The bound and the
+    policy apply to the tasks of all shards together, drop-oldest drops
+    from the longest shard.
     """
 
-    def __init__(self, max_pool_size=10):
-        self.max_pool_size = max_pool_size
-        self._threads = []
-        self._tasks = []
+    def __init__(self, max_pool_size=4, max_queue=0, policy=BLOCK):
+        ThreadPool.__init__(self, max_pool_size, max_queue, policy)
+        self._shards = dict()       # {shard: deque of its queued tasks}
+        self._ready_shards = deque()    # shards with tasks and no worker on them
+        self._busy = set()          # shards a worker runs a task of
+        self._count = 0
 
-    def _add_task(self, task):
-        self._tasks.append(task)
+    def _push(self, task):
+        queue = self._shards.get(task.shard)
+        if queue is None:
+            queue = self._shards[task.shard] = deque()
+        queue.append(task)
+        self._count += 1
+        if len(queue) == 1 and task.shard not in self._busy:
+            self._ready_shards.append(task.shard)
+
+    def _pop(self):
+        shard = self._ready_shards.popleft()
+        self._busy.add(shard)
+        self._count -= 1
+        return self._shards[shard].popleft()
 
-        worker_thread = None
-        for thread in self._threads:
-            if thread.busy is False:
-                worker_thread = thread
-                break
+    def _drop(self):
+        shard = max(self._shards, key=lambda s: len(self._shards[s]))
+        queue = self._shards[shard]
+        task = queue.popleft()
+        self._count -= 1
+        if not queue and shard not in self._busy:
+            del self._shards[shard]
+            self._ready_shards.remove(shard)
+        return task
 
-        if worker_thread is None and len(self._threads) <= self.max_pool_size:
-            worker_thread = WorkerThread(self)
-            self._threads.append(worker_thread)
+    def _ready(self):
+        return len(self._ready_shards)
+
+    def _release(self, task):
+        self._busy.discard(task.shard)
+        if self._shards[task.shard]:
+            self._ready_shards.append(task.shard)
+            self._not_empty.notify()
+        else:
+            del self._shards[task.shard]
+            if self._shutdown and not self._count:
+                #workers waiting on busy shards may stop now
+                self._not_empty.notify_all()
 
-        if worker_thread is not None:
-            worker_thread.work()
+    def qsize(self):
+        return self._count
 
-    def addTask(self, function, args=(), kwargs={}):
-        self._add_task(WorkerTask(function, args, kwargs))
\ No newline at end of file
+    def get_stat(self):
+        stat = ThreadPool.get_stat(self)
+        stat['workers'] = len(self._threads)
+        stat['shards'] = len(self._shards)
+        return stat
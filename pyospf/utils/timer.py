@@ -1,58 +1,59 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
-import threading
+from pyospf.utils.reactor import Reactor
+from pyospf.utils.util import monotonic
 
 
-class Timer(threading.Thread):
+class Timer(object):
     """
     a timer that execute an action at the end of the timer run.
+    The action runs on the reactor thread, the timer has no thread of its own.
     """
 
-    def __init__(self, seconds, action=None, args=None, once=False):
+    def __init__(self, seconds, action=None, args=None, once=False, reactor=None):
         self.counter = 0
         self.runTime = seconds
         self.args = args
         self.action = action
-        self.stopEvent = threading.Event()
         self.once = once
-        threading.Thread.__init__(self, args=self.stopEvent)
-        #Set all timer threads daemon. When main thread exits, all threads exit.
-        self.setDaemon(True)
-        self.resetFlag = True
+        self.reactor = reactor or Reactor()
         self.stopFlag = False
+        self._entry = None          # where the reactor timer store keeps it
+        self._expires = 0
 
-    def run(self):
-        while not self.stopFlag:
-            while self.resetFlag and not self.stopFlag:
-                self.stopEvent.clear()
-                self.resetFlag = False
-                self.stopEvent.wait(self.runTime)
-            if not self.resetFlag and not self.stopFlag:
-                if self.action:
-                    if self.args:
-                        self.action(self.args)
-                    else:
-                        self.action()
+    def start(self):
+        self.stopFlag = False
+        self.reactor.schedule(self, monotonic() + self.runTime)
+
+    def _expire(self):
+        if self.stopFlag:
+            return
+        try:
+            if self.action:
+                if self.args:
+                    self.action(self.args)
+                else:
+                    self.action()
+        finally:
             if self.once:
                 self.stopFlag = True
-            self.resetFlag = True
-        else:
-            self.stopEvent.set()
+            elif not self.stopFlag and self._entry is None:
+                #the action may have reset the timer already
+                self.reactor.schedule(self, monotonic() + self.runTime)
 
     def reset(self, runtime=None):
         if runtime:
             self.runTime = runtime
-        self.resetFlag = True
-        self.stopEvent.set()
+        if not self.stopFlag:
+            self.reactor.schedule(self, monotonic() + self.runTime)
 
     def stop(self):
         self.stopFlag = True
-        self.stopEvent.set()
+        self.reactor.cancel(self)
 
     def get_counter(self):
         return self.counter
 
     def is_stop(self):
-        return self.stopEvent.isSet()
-
+        return self.stopFlag
@@ -2,7 +2,8 @@
 # -*- coding:utf-8 -*-
 
 
-import struct, socket, string, sys, datetime, ipaddr, re
+import struct, socket, string, sys, time, datetime, ipaddr, re
+import ctypes, ctypes.util
 
 
 def find_num_in_string(string):
@@ -248,6 +249,42 @@ def current_time_str():
     return str(datetime.datetime.now())
 
 
+#Python 2 has no time.monotonic, CLOCK_MONOTONIC is read with clock_gettime.
+CLOCK_MONOTONIC = 1
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+try:
+    _clock_gettime = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c')).clock_gettime
+    _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+    if _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(_Timespec())) != 0:
+        raise OSError('clock_gettime failed')
+except (OSError, AttributeError, TypeError):
+    _clock_gettime = None
+
+
+def monotonic():
+    """
+    Seconds of a clock which never goes back, for durations only. Falls
+    back to time.time() where clock_gettime is not available.
+    """
+    if _clock_gettime is None:
+        return time.time()
+    ts = _Timespec()
+    _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts))
+    return ts.tv_sec + ts.tv_nsec * 1e-9
+
+
+def monotonic_to_str(ts):
+    """
+    The wall clock time of monotonic() time ts, as current_time_str() has it.
+    """
+    return str(datetime.datetime.now() - datetime.timedelta(seconds=monotonic() - ts))
+
+
 def hex2byte(hex_str):
     """
     Convert a string hex byte values into a byte string. The Hex Byte values may
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Hierarchical timing wheel (Varghese & Lauck, as in the Linux timer base).
+Adding, resetting and cancelling a timer is O(1): a timer sits in one slot
+set of one level, chosen from how far away it expires. Slots of the upper
+levels are cascaded down as time reaches them.
+"""
+
+from pyospf.utils.util import monotonic
+
+
+TICK = 0.01                 # seconds per tick
+WHEEL_BITS = [8, 6, 6, 6]   # slots per level, 256 then 64 each, ~77 days at TICK
+MAX_TICKS = (1 << sum(WHEEL_BITS)) - 1
+
+
+class _Slot(set):
+    """
+    Timers of one slot, knowing the level it belongs to.
+    """
+    __slots__ = ('level',)
+
+    def __init__(self, level):
+        set.__init__(self)
+        self.level = level
+
+
+class TimingWheel(object):
+    """
+    Timer store of the reactor. Timers are kept by the tick they expire at,
+    expire() returns the ones due. Not thread safe, the reactor locks it.
+    """
+
+    def __init__(self, tick=TICK, now=None):
+        self.tick_len = tick
+        self.tick = self._ticks(monotonic() if now is None else now)    # next tick to process
+        self.count = 0
+        self._levels = [[_Slot(level) for _ in xrange(1 << bits)]
+                        for level, bits in enumerate(WHEEL_BITS)]
+        self._shifts = [sum(WHEEL_BITS[:level]) for level in xrange(len(WHEEL_BITS))]
+        self._counts = [0] * len(WHEEL_BITS)    # timers per level
+        #(ticks the level reaches, shift, index mask, level) from the bottom up
+        self._table = [(1 << (shift + bits), shift, (1 << bits) - 1, level)
+                       for level, (shift, bits) in enumerate(zip(self._shifts, WHEEL_BITS))]
+        self._next = None           # cached next tick to wake up at, None when unknown
+
+    def __len__(self):
+        return self.count
+
+    def _ticks(self, t):
+        return int(t / self.tick_len)
+
+    def _place(self, timer, expires):
+        """
+        Put timer in the slot for tick expires, relative to self.tick.
+        """
+        delta = expires - self.tick
+        if delta < 0:
+            expires, delta = self.tick, 0
+        elif delta > MAX_TICKS:
+            #beyond the wheel, parked in the last slot and placed again from there
+            expires, delta = self.tick + MAX_TICKS, MAX_TICKS
+        for (reach, shift, mask, level) in self._table:
+            if delta < reach:
+                break
+        slot = self._levels[level][(expires >> shift) & mask]
+        slot.add(timer)
+        timer._entry = slot
+        self._counts[level] += 1
+
+    def _remove(self, timer):
+        timer._entry.discard(timer)
+        self._counts[timer._entry.level] -= 1
+
+    def add(self, timer, deadline):
+        """
+        Arm timer to expire at deadline, moving it if already armed.
+        """
+        slot = timer._entry
+        if slot is not None:
+            slot.discard(timer)
+            self._counts[slot.level] -= 1
+        else:
+            self.count += 1
+        #Round up, a timer never fires before its deadline.
+        expires = self._ticks(deadline)
+        if expires * self.tick_len < deadline:
+            expires += 1
+        timer._expires = expires
+        self._place(timer, expires)
+        if self._next is not None and expires < self._next:
+            self._next = max(expires, self.tick)
+
+    def cancel(self, timer):
+        if timer._entry is not None:
+            self._remove(timer)
+            timer._entry = None
+            self.count -= 1
+
+    def _cascade(self, level):
+        """
+        Move the timers of the current slot of level down to lower levels.
+        Return the slot index, 0 means the level above is due as well.
+        """
+        slots = self._levels[level]
+        index = (self.tick >> self._shifts[level]) & (len(slots) - 1)
+        timers, slots[index] = slots[index], _Slot(level)
+        self._counts[level] -= len(timers)
+        for timer in timers:
+            self._place(timer, timer._expires)
+        return index
+
+    def _next_cascade(self):
+        """
+        The next tick at which a cascade may bring timers down to level 0,
+        skipping the cascades of levels which are empty as well.
+        """
+        bits = WHEEL_BITS[0]
+        for level in xrange(1, len(WHEEL_BITS) - 1):
+            if self._counts[level]:
+                break
+            bits += WHEEL_BITS[level]
+        return (self.tick | ((1 << bits) - 1)) + 1
+
+    def expire(self, now):
+        """
+        Advance to now and return the timers due, disarmed.
+        """
+        target = self._ticks(now)
+        due = []
+        self._next = None
+        level0 = self._levels[0]
+        mask = len(level0) - 1
+        while self.count and self.tick <= target:
+            index = self.tick & mask
+            if not index:
+                level = 1
+                while level < len(self._levels) and not self._cascade(level):
+                    level += 1
+            if not self._counts[0]:
+                #nothing at the bottom until the next cascade, skip to it
+                self.tick = min(self._next_cascade(), target + 1)
+                continue
+            slot = level0[index]
+            if slot:
+                level0[index] = _Slot(0)
+                self._counts[0] -= len(slot)
+                for timer in slot:
+                    if timer._expires > self.tick:
+                        #parked beyond the wheel, not due yet
+                        self._place(timer, timer._expires)
+                        continue
+                    timer._entry = None
+                    self.count -= 1
+                    due.append(timer)
+            self.tick += 1
+        self.tick = max(self.tick, target + 1)
+        return due
+
+    def next_deadline(self):
+        """
+        Time of the next tick with timers in it, or of the next cascade when
+        the bottom level is empty up to it. None when nothing is armed.
+        """
+        if not self.count:
+            return None
+        if self._next is None:
+            level0 = self._levels[0]
+            mask = len(level0) - 1
+            tick = self.tick
+            if tick & mask:
+                if self._counts[0]:
+                    end = (tick | mask) + 1
+                    while tick < end and not level0[tick & mask]:
+                        tick += 1
+                else:
+                    tick = self._next_cascade()
+            self._next = tick
+        return self._next * self.tick_len